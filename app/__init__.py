@@ -1,16 +1,12 @@
 import os
+import click
 from flask import Flask, jsonify
 from .config import DevelopmentConfig, ProductionConfig
-from .extensions import db, migrate
+from .extensions import db
 from .utils.logging import setup_logging
-from dotenv import load_dotenv
+from .utils.templating import register_template_helpers
 
 def create_app(config_name=None):
-    # 本地開發讀 .env
-    load_dotenv()
-
-    print("Using S3 bucket:", os.getenv("S3_BUCKET"))
-
     app = Flask(__name__, 
                 static_folder=os.path.join(os.getcwd(), 'static'),
                 template_folder=os.path.join(os.getcwd(), 'templates'))
@@ -25,10 +21,36 @@ def create_app(config_name=None):
 
     # 設置日誌
     setup_logging(app)
+    app.logger.info(f"Using R2 bucket: {app.config.get('R2_BUCKET_NAME')}")
 
-    # 初始化 extensions
+    # 請求耗時量測（Server-Timing 與 /metrics 直方圖）
+    from .utils.timing import init_timing
+    init_timing(app)
+
+    # 初始化 extensions（連線池量測要在建立 engine 之前設定）
+    from .utils.database import init_database
+    init_database(app)
     db.init_app(app)
-    migrate.init_app(app, db)
+
+    # 模板共用函式
+    register_template_helpers(app)
+
+    # 打包後的靜態檔（flask assets build）
+    from .utils.assets import init_assets
+    init_assets(app)
+
+    # 相簿頁面的 ETag / 304
+    from .utils.http_cache import init_http_cache
+    init_http_cache(app)
+
+    # CLI 指令（較重的模組在各指令內才匯入）
+    from .commands import register_commands
+    register_commands(app)
+
+    # 資料庫遷移只在 flask 指令中需要，gunicorn worker 不載入 Flask-Migrate / Alembic
+    if click.get_current_context(silent=True) is not None:
+        from flask_migrate import Migrate
+        Migrate(app, db)
 
     # 註冊藍圖
     from .blueprints.home import bp as home_bp      # 主畫面
@@ -36,12 +58,14 @@ def create_app(config_name=None):
     from .blueprints.birthday import bp as birthday_bp  # 🎂 生日頁面 (修正導入)
     from .blueprints.upload import bp as upload_bp
     from .blueprints.delete import bp as delete_bp
+    from .blueprints.metrics import bp as metrics_bp
     
     app.register_blueprint(home_bp)      # 主畫面作為根路由
     app.register_blueprint(memory_bp)    # 回憶膠卷移到 /memory
     app.register_blueprint(birthday_bp)  # 🎂 生日頁面註冊
     app.register_blueprint(upload_bp)
     app.register_blueprint(delete_bp)
+    app.register_blueprint(metrics_bp)
 
     # 全域錯誤處理
     @app.errorhandler(404)
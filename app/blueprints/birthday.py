@@ -1,21 +1,35 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, jsonify
 from ..services.birthday_service import (
-    list_birthday_photos, 
-    save_birthday_photo, 
+    list_birthday_photos_page,
+    save_birthday_photos,
+    register_uploaded_birthday_photos,
     delete_birthday_photo,
-    get_birthday_photos_by_year,
+    delete_birthday_photos,
     get_birthday_years,
     get_birthday_stats
 )
+from ..services.direct_upload import presign_request, complete_request
+from ..services.export import iter_rows, export_entries, zip_response
+from ..models import BirthPhoto
+from ..utils.http_cache import conditional
+from ..utils.templating import image_payload
+from .upload import direct_upload_payload
+from .delete import bulk_delete_ids, bulk_delete_response
 from datetime import datetime
 
 bp = Blueprint('birthday', __name__, url_prefix='/birthday')
 
 @bp.route('/')
+@conditional(BirthPhoto)
 def index():
     """生日主頁面"""
-    # 獲取所有生日照片
-    photos = list_birthday_photos()
+    # 獲取當前篩選年份
+    selected_year = request.args.get('year', type=int)
+
+    # 只渲染第一頁生日照片，其餘由前端分頁載入
+    photos, next_cursor = list_birthday_photos_page(
+        current_app.config['GALLERY_PAGE_SIZE'], year=selected_year or None
+    )
     
     # 獲取年份列表用於篩選
     years = get_birthday_years()
@@ -23,32 +37,25 @@ def index():
     # 獲取統計資訊
     stats = get_birthday_stats()
     
-    # 獲取當前篩選年份
-    selected_year = request.args.get('year', type=int)
-    if selected_year:
-        photos = get_birthday_photos_by_year(selected_year)
-    
     # 🔧 添加當前年份變數
     current_year = datetime.now().year
     
     return render_template('birthday/index.html', 
                          photos=photos, 
+                         next_cursor=next_cursor,
                          years=years, 
                          selected_year=selected_year,
                          stats=stats,
                          current_year=current_year)  # 🔧 傳遞給模板
 
-@bp.route('/upload', methods=['POST'])
-def upload():
-    """上傳生日照片"""
-    if 'photos' not in request.files:
-        flash('找不到上傳欄位', 'error')
-        return redirect(url_for('birthday.index'))
-    
-    files = request.files.getlist('photos')
-    birthday_year = request.form.get('birthday_year', type=int)
-    birthday_date = request.form.get('birthday_date', '').strip()  # 🔧 新增生日日期欄位
-    description = request.form.get('description', '').strip()
+def _birthday_fields(data):
+    """從表單或 JSON 取出 (年份, 生日日期, 描述)，日期格式錯誤時拋出 ValueError"""
+    try:
+        birthday_year = int(data.get('birthday_year') or 0)
+    except (TypeError, ValueError):
+        birthday_year = 0
+    birthday_date = str(data.get('birthday_date') or '').strip()  # 🔧 新增生日日期欄位
+    description = str(data.get('description') or '').strip()
     
     # 如果沒有指定年份，使用當前年份
     if not birthday_year:
@@ -62,25 +69,38 @@ def upload():
     try:
         datetime.strptime(birthday_date, '%m-%d')
     except ValueError:
-        flash('生日日期格式錯誤，請使用 MM-DD 格式（例如：01-01）', 'error')
+        raise ValueError('生日日期格式錯誤，請使用 MM-DD 格式（例如：01-01）')
+    return birthday_year, birthday_date, description or None
+
+@bp.route('/upload', methods=['POST'])
+def upload():
+    """上傳生日照片"""
+    if 'photos' not in request.files:
+        flash('找不到上傳欄位', 'error')
         return redirect(url_for('birthday.index'))
     
+    files = request.files.getlist('photos')
+    try:
+        birthday_year, birthday_date, description = _birthday_fields(request.form)
+    except ValueError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('birthday.index'))
+    
+    files = [file for file in files if file and file.filename]
     uploaded_count = 0
-    for file in files:
-        if file and file.filename:
-            try:
-                save_birthday_photo(
-                    file, 
-                    birthday_year=birthday_year,
-                    birthday_date=birthday_date,  # 🔧 傳遞生日日期
-                    description=description if description else None
-                )
-                uploaded_count += 1
-            except ValueError as ve:
-                flash(str(ve), 'warning')
-            except Exception:
-                current_app.logger.exception(f"Birthday upload failed for {file.filename}")
-                flash(f"上傳失敗: {file.filename}", 'error')
+    for file, error in save_birthday_photos(
+        files,
+        birthday_year=birthday_year,
+        birthday_date=birthday_date,  # 🔧 傳遞生日日期
+        description=description
+    ):
+        if error is None:
+            uploaded_count += 1
+        elif isinstance(error, ValueError):
+            flash(str(error), 'warning')
+        else:
+            current_app.logger.error(f"Birthday upload failed for {file.filename}", exc_info=error)
+            flash(f"上傳失敗: {file.filename}", 'error')
     
     if uploaded_count > 0:
         pass
@@ -88,6 +108,23 @@ def upload():
     
     return redirect(url_for('birthday.index'))
 
+@bp.route('/presign', methods=['POST'])
+def presign():
+    """API: 取得直接上傳到 bucket 的網址，檔案內容不經過本伺服器"""
+    return jsonify({'uploads': presign_request(direct_upload_payload())})
+
+@bp.route('/complete', methods=['POST'])
+def complete():
+    """API: 瀏覽器直傳完成後登記生日照片並排入背景縮圖"""
+    data = direct_upload_payload()
+    try:
+        birthday_year, birthday_date, description = _birthday_fields(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'uploads': complete_request(
+        data, lambda keys: register_uploaded_birthday_photos(keys, birthday_year, birthday_date, description)
+    )})
+
 @bp.route('/delete/<int:photo_id>', methods=['POST'])
 def delete(photo_id):
     """刪除生日照片"""
@@ -99,16 +136,49 @@ def delete(photo_id):
         flash('找不到該照片', 'error')
     return redirect(url_for('birthday.index'))
 
+@bp.route('/delete/bulk', methods=['POST'])
+def bulk_delete():
+    """API: 一次刪除多張生日照片"""
+    ids = bulk_delete_ids()
+    if ids is None:
+        return jsonify({'error': f"一次最多刪除 {current_app.config['BULK_DELETE_MAX']} 張照片"}), 400
+    return bulk_delete_response(*delete_birthday_photos(ids))
+
 @bp.route('/api/stats')
 def api_stats():
     """API: 獲取生日照片統計"""
     stats = get_birthday_stats()
     return jsonify(stats)
 
+@bp.route('/api/photos')
+def api_photos():
+    """API: 以游標分頁取得生日照片，可用 year 參數篩選年份"""
+    limit = request.args.get('limit', current_app.config['GALLERY_PAGE_SIZE'], type=int)
+    limit = max(1, min(limit, current_app.config['GALLERY_PAGE_MAX']))
+    try:
+        photos, next_cursor = list_birthday_photos_page(
+            limit, request.args.get('cursor'), year=request.args.get('year', type=int)
+        )
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    items = []
+    for photo in photos:
+        item = image_payload(photo)
+        item.update({
+            'birthday_year': photo.birthday_year,
+            'description': photo.description,
+            'date_display': photo.uploaded_at.strftime('%Y年%m月%d日') if photo.uploaded_at else '',
+            'delete_url': url_for('birthday.delete', photo_id=photo.id),
+        })
+        items.append(item)
+    return jsonify({'photos': items, 'next_cursor': next_cursor})
+
 @bp.route('/year/<int:year>')
+@conditional(BirthPhoto)
 def year_view(year):
     """特定年份的生日照片頁面"""
-    photos = get_birthday_photos_by_year(year)
+    photos, next_cursor = list_birthday_photos_page(current_app.config['GALLERY_PAGE_SIZE'], year=year)
     years = get_birthday_years()
     stats = get_birthday_stats()
     
@@ -117,7 +187,14 @@ def year_view(year):
     
     return render_template('birthday/index.html', 
                          photos=photos, 
+                         next_cursor=next_cursor,
                          years=years, 
                          selected_year=year,
                          stats=stats,
-                         current_year=current_year)  # 🔧 傳遞給模板
\ No newline at end of file
+                         current_year=current_year)  # 🔧 傳遞給模板
+
+@bp.route('/year/<int:year>/export')
+def year_export(year):
+    """下載特定年份的生日照片（邊讀 R2 邊產生的 ZIP 串流）"""
+    photos = iter_rows(lambda limit, cursor: list_birthday_photos_page(limit, cursor, year=year))
+    return zip_response(export_entries(photos, folder=f'{year}/'), f'birthday_{year}.zip')
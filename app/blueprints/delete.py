@@ -1,5 +1,5 @@
-from flask import Blueprint, redirect, url_for, flash
-from ..services.photo_service import delete_photo
+from flask import Blueprint, redirect, url_for, flash, request, jsonify, current_app
+from ..services.photo_service import delete_photo, delete_photos
 
 bp = Blueprint('delete', __name__, url_prefix='/delete')
 
@@ -10,4 +10,27 @@ def delete(photo_id):
         pass
     else:
         flash('找不到該圖片', 'error')
-    return redirect(url_for('memory.index'))  # 修改：重定向到回憶膠卷頁面
\ No newline at end of file
+    return redirect(url_for('memory.index'))  # 修改：重定向到回憶膠卷頁面
+
+def bulk_delete_ids():
+    """從 JSON {"ids": [...]} 取出要刪除的照片 id，超過 BULK_DELETE_MAX 時回傳 None"""
+    ids = (request.get_json(silent=True) or {}).get('ids') or []
+    if not isinstance(ids, list) or len(ids) > current_app.config['BULK_DELETE_MAX']:
+        return None
+    return [int(photo_id) for photo_id in ids if str(photo_id).isdigit()]
+
+def bulk_delete_response(deleted, missing, failures):
+    """批次刪除結果：storage_failures 列出紀錄已刪除但 R2 物件刪除失敗的 key"""
+    return jsonify({
+        'deleted': deleted,
+        'not_found': missing,
+        'storage_failures': [{'key': key, 'error': error} for key, error in failures.items()],
+    })
+
+@bp.route('/bulk', methods=['POST'])
+def bulk_delete():
+    """API: 一次刪除多張回憶照片"""
+    ids = bulk_delete_ids()
+    if ids is None:
+        return jsonify({'error': f"一次最多刪除 {current_app.config['BULK_DELETE_MAX']} 張照片"}), 400
+    return bulk_delete_response(*delete_photos(ids))
@@ -1,9 +1,11 @@
 from flask import Blueprint, render_template
-from ..services.bookmark_service import get_all_bookmarks
+from ..services.bookmark_service import get_all_bookmarks, counted_models, registry_fingerprint
+from ..utils.http_cache import conditional
 
 bp = Blueprint('home', __name__, url_prefix='/')
 
 @bp.route('/')
+@conditional(*counted_models(), extra=registry_fingerprint())
 def index():
     """主畫面 - 顯示書本和書籤"""
     bookmarks = get_all_bookmarks()
@@ -1,10 +1,37 @@
-from flask import Blueprint, render_template
-from ..services.photo_service import list_photos
+from flask import Blueprint, render_template, request, jsonify, url_for, current_app
+from ..services.photo_service import list_photos_page
+from ..services.export import iter_rows, export_entries, zip_response
+from ..models import Photo
+from ..utils.http_cache import conditional
+from ..utils.templating import image_payload
 
 bp = Blueprint('memory', __name__, url_prefix='/memory')
 
 @bp.route('/')
+@conditional(Photo)
 def index():
-    """回憶膠卷頁面（原來的主頁面）"""
-    photos = list_photos()
-    return render_template('memory/index.html', images=photos)
\ No newline at end of file
+    """回憶膠卷頁面（原來的主頁面），只渲染第一頁，其餘由前端分頁載入"""
+    photos, next_cursor = list_photos_page(current_app.config['GALLERY_PAGE_SIZE'])
+    return render_template('memory/index.html', images=photos, next_cursor=next_cursor)
+
+@bp.route('/api/photos')
+def api_photos():
+    """API: 以游標分頁取得照片"""
+    limit = request.args.get('limit', current_app.config['GALLERY_PAGE_SIZE'], type=int)
+    limit = max(1, min(limit, current_app.config['GALLERY_PAGE_MAX']))
+    try:
+        photos, next_cursor = list_photos_page(limit, request.args.get('cursor'))
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    items = []
+    for photo in photos:
+        item = image_payload(photo)
+        item['delete_url'] = url_for('delete.delete', photo_id=photo.id)
+        items.append(item)
+    return jsonify({'photos': items, 'next_cursor': next_cursor})
+
+@bp.route('/export')
+def export():
+    """下載整個回憶膠卷（邊讀 R2 邊產生的 ZIP 串流）"""
+    return zip_response(export_entries(iter_rows(list_photos_page)), 'memories.zip')
@@ -0,0 +1,22 @@
+import os
+from flask import Blueprint, Response, jsonify, request
+from ..services.jobs import pending_jobs
+from ..utils import metrics
+from ..utils.database import pool_status
+
+bp = Blueprint('metrics', __name__, url_prefix='/metrics')
+
+@bp.route('/')
+def index():
+    """目前 worker 的效能計數器；Prometheus 抓取（Accept: text/plain）或 ?format=prometheus 時輸出文字格式"""
+    best = request.accept_mimetypes.best_match(['application/json', 'text/plain; version=0.0.4', 'text/plain'])
+    wants_text = bool(best) and best.startswith('text/plain')
+    if request.args.get('format') == 'prometheus' or wants_text:
+        return Response(metrics.prometheus_text(), mimetype='text/plain; version=0.0.4')
+    return jsonify({
+        'pid': os.getpid(),
+        'pending_jobs': pending_jobs(),
+        'db_pools': pool_status(),
+        'cache_hit_rates': metrics.hit_rates(),
+        'counters': metrics.snapshot(),
+    })
@@ -1,5 +1,6 @@
-from flask import Blueprint, request, redirect, url_for, flash, current_app
-from ..services.photo_service import save_photo
+from flask import Blueprint, request, redirect, url_for, flash, current_app, jsonify, abort
+from ..services.photo_service import save_photos, register_uploaded_photos
+from ..services.direct_upload import presign_request, complete_request
 
 bp = Blueprint('upload', __name__, url_prefix='/upload')
 
@@ -8,14 +9,27 @@ def upload():
     if 'photos' not in request.files:
         flash('找不到上傳欄位', 'error')
         return redirect(url_for('memory.index'))  # 修改：重定向到回憶膠卷頁面
-    files = request.files.getlist('photos')
-    for file in files:
-        if file and file.filename:
-            try:
-                save_photo(file)
-            except ValueError as ve:
-                flash(str(ve), 'warning')
-            except Exception:
-                current_app.logger.exception(f"Upload failed for {file.filename}")
-                flash(f"上傳失敗: {file.filename}", 'error')
-    return redirect(url_for('memory.index'))  # 修改：重定向到回憶膠卷頁面
\ No newline at end of file
+    files = [file for file in request.files.getlist('photos') if file and file.filename]
+    for file, error in save_photos(files):
+        if isinstance(error, ValueError):
+            flash(str(error), 'warning')
+        elif error is not None:
+            current_app.logger.error(f"Upload failed for {file.filename}", exc_info=error)
+            flash(f"上傳失敗: {file.filename}", 'error')
+    return redirect(url_for('memory.index'))  # 修改：重定向到回憶膠卷頁面
+
+def direct_upload_payload():
+    """讀取直傳 API 的 JSON 內容；未啟用 DIRECT_UPLOAD_ENABLED 時回應 404"""
+    if not current_app.config.get('DIRECT_UPLOAD_ENABLED'):
+        abort(404)
+    return request.get_json(silent=True) or {}
+
+@bp.route('/presign', methods=['POST'])
+def presign():
+    """API: 取得直接上傳到 bucket 的網址，檔案內容不經過本伺服器"""
+    return jsonify({'uploads': presign_request(direct_upload_payload())})
+
+@bp.route('/complete', methods=['POST'])
+def complete():
+    """API: 瀏覽器直傳完成後登記照片並排入背景縮圖"""
+    return jsonify({'uploads': complete_request(direct_upload_payload(), register_uploaded_photos)})
@@ -0,0 +1,224 @@
+import click, os, resource, subprocess, sys, tempfile, time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+from sqlalchemy import func, or_, tuple_
+from .extensions import db
+from .models import Photo, BirthPhoto, PHASH_BANDS, phash_band
+from .services.storage import format_savings
+from .services.dedup import find_near_duplicates
+from .services.imaging import open_image, load_for_resize, resize
+from .utils.assets import build_assets
+
+images_cli = AppGroup('images', help='圖片相關的維護指令')
+perf_cli = AppGroup('perf', help='效能檢查指令')
+assets_cli = AppGroup('assets', help='靜態檔建置指令')
+
+@images_cli.command('savings')
+def savings():
+    """列出每張照片各格式的大小與省下的位元組數"""
+    total_base = total_best = 0
+    for model in (Photo, BirthPhoto):
+        for photo in model.query.order_by(model.id).all():
+            report = format_savings(photo.variants)
+            if not report:
+                continue
+            base = report[photo.variants[0]['format']]['bytes']
+            best_fmt = min(report, key=lambda fmt: report[fmt]['bytes'])
+            total_base += base
+            total_best += report[best_fmt]['bytes']
+            detail = ', '.join(f"{fmt}={info['bytes']}" for fmt, info in report.items())
+            click.echo(f"{model.__tablename__}#{photo.id}: {detail} -> best {best_fmt}, saved {report[best_fmt]['saved']} bytes")
+    if total_base:
+        click.echo(f"Total: {total_base} -> {total_best} bytes ({100 * (total_base - total_best) / total_base:.1f}% saved)")
+
+@images_cli.command('duplicates')
+@click.option('--distance', type=int, default=None, help='感知雜湊的最大漢明距離，預設為 NEAR_DUPLICATE_DISTANCE')
+def duplicates(distance):
+    """列出每個相簿中內容相近的照片"""
+    for model in (Photo, BirthPhoto):
+        for photo_id, phash in db.session.query(model.id, model.phash).filter(model.phash.isnot(None)).order_by(model.id):
+            # 每一組只從較小的 id 列出一次
+            matches = [(other, d) for other, d in find_near_duplicates(model, phash, photo_id, distance) if other > photo_id]
+            for other, d in matches:
+                click.echo(f"{model.__tablename__}#{photo_id} ~ #{other} (distance {d})")
+
+@images_cli.command('reconcile')
+@click.option('--stale-after', type=int, default=None, help='pending 超過幾秒才處理，預設為 PENDING_TIMEOUT')
+@click.option('--wait', type=float, default=300, show_default=True, help='等待重新排入的工作完成的秒數')
+def reconcile(stale_after, wait):
+    """重新處理或標記失敗遺失了背景工作、一直停在處理中的上傳"""
+    from .services.image_jobs import reconcile_pending
+    from .services.jobs import wait_for_jobs
+    requeued, failed = reconcile_pending(stale_after)
+    click.echo(f"Requeued {requeued}, marked {failed} failed")
+    if requeued and not wait_for_jobs(wait):
+        raise click.ClickException(f"重新處理的工作在 {wait:.0f} 秒內沒有全部完成")
+
+def _gallery_queries():
+    """與 services 中相簿查詢形狀相同的語句，以及預期使用的索引"""
+    now = datetime.utcnow()
+    birthday_order = (BirthPhoto.birthday_year.desc(), BirthPhoto.uploaded_at.desc(), BirthPhoto.id.desc())
+    return [
+        ('photo first page', 'ix_photo_uploaded_at_id',
+         Photo.query.order_by(Photo.uploaded_at, Photo.id).limit(31)),
+        ('photo next page', 'ix_photo_uploaded_at_id',
+         Photo.query.filter(tuple_(Photo.uploaded_at, Photo.id) > tuple_(now, 0))
+         .order_by(Photo.uploaded_at, Photo.id).limit(31)),
+        ('birthday first page', 'ix_birth_photo_year_uploaded_at_id',
+         BirthPhoto.query.order_by(*birthday_order).limit(31)),
+        ('birthday next page', 'ix_birth_photo_year_uploaded_at_id',
+         BirthPhoto.query.filter(tuple_(BirthPhoto.birthday_year, BirthPhoto.uploaded_at, BirthPhoto.id)
+                                 < tuple_(now.year, now, 0))
+         .order_by(*birthday_order).limit(31)),
+        ('birthday by year', 'ix_birth_photo_year_uploaded_at_id',
+         BirthPhoto.query.filter_by(birthday_year=now.year).order_by(*birthday_order).limit(31)),
+        ('photo near duplicates', 'ix_photo_phash_b0',
+         db.session.query(Photo.id, Photo.phash)
+         .filter(or_(*(phash_band(Photo.phash, i) == '00' for i in range(PHASH_BANDS))))),
+        ('birthday stats', 'ix_birth_photo_year_uploaded_at_id',
+         db.session.query(BirthPhoto.birthday_year, func.count(BirthPhoto.id))
+         .group_by(BirthPhoto.birthday_year).order_by(BirthPhoto.birthday_year.desc())),
+    ]
+
+def _explain(query):
+    """取得查詢的執行計畫文字"""
+    dialect = db.engine.dialect
+    sql = str(query.statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+    if dialect.name == 'sqlite':
+        rows = db.session.connection().exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}').all()
+        return '\n'.join(row[-1] for row in rows)
+    if dialect.name == 'postgresql':
+        # 小資料表時 planner 會偏好循序掃描，這裡只確認索引「可以」被使用
+        db.session.connection().exec_driver_sql('SET LOCAL enable_seqscan = off')
+    rows = db.session.connection().exec_driver_sql(f'EXPLAIN {sql}').all()
+    return '\n'.join(str(row[0]) for row in rows)
+
+@perf_cli.command('explain')
+def explain():
+    """顯示相簿查詢的執行計畫，並確認都有用到索引"""
+    missing = []
+    try:
+        for name, index, query in _gallery_queries():
+            plan = _explain(query)
+            used = index in plan
+            click.echo(f"[{'OK' if used else 'NO INDEX'}] {name} (expects {index})")
+            for line in plan.splitlines():
+                click.echo(f"    {line}")
+            if not used:
+                missing.append(name)
+    finally:
+        db.session.rollback()
+    if missing:
+        raise click.ClickException(f"Queries not using their index: {', '.join(missing)}")
+
+def _decode_and_resize(path, width, pipeline, max_pixels):
+    """在獨立的子行程中縮圖一次，回傳 (秒數, 峰值 RSS 增加的 KB, 輸出尺寸)"""
+    from PIL import Image
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    with open(path, 'rb') as f:
+        if pipeline:
+            img = resize(load_for_resize(open_image(f, max_pixels), width), width)
+        else:
+            # 改版前的做法：整張解碼後再縮圖
+            img = Image.open(f)
+            img.load()
+            img.thumbnail((width, width), Image.LANCZOS)
+        size = img.size
+    elapsed = time.perf_counter() - start
+    return elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline, size
+
+@perf_cli.command('imaging')
+@click.argument('paths', nargs=-1, type=click.Path(exists=True, dir_okay=False))
+@click.option('--width', type=int, default=None, help='輸出的最大邊長，預設為 IMAGE_VARIANT_WIDTHS 中最大的值')
+@click.option('--synthetic', default='8000x6000', show_default=True, help='沒有指定檔案時產生的測試 JPEG 尺寸')
+@click.option('--repeat', type=int, default=3, show_default=True)
+def imaging(paths, width, synthetic, repeat):
+    """比較整張解碼與 draft/reduce 縮圖流程的時間與峰值記憶體"""
+    from PIL import Image
+    width = width or max(current_app.config['IMAGE_VARIANT_WIDTHS'])
+    max_pixels = current_app.config['IMAGE_MAX_PIXELS']
+    with tempfile.TemporaryDirectory() as tmp:
+        if not paths:
+            w, h = (int(v) for v in synthetic.lower().split('x'))
+            path = os.path.join(tmp, f'synthetic_{w}x{h}.jpg')
+            Image.effect_noise((w, h), 64).convert('RGB').save(path, quality=90)
+            paths = (path,)
+        for path in paths:
+            for pipeline in (False, True):
+                # 每次都用新的子行程，峰值 RSS 才不會被上一輪墊高
+                runs = []
+                for _ in range(repeat):
+                    with ProcessPoolExecutor(max_workers=1) as pool:
+                        runs.append(pool.submit(_decode_and_resize, path, width, pipeline, max_pixels).result())
+                best = min(run[0] for run in runs)
+                peak = max(run[1] for run in runs)
+                label = 'draft+reduce' if pipeline else 'full decode'
+                click.echo(f"{os.path.basename(path)} [{label}] -> {runs[0][2][0]}x{runs[0][2][1]}: "
+                           f"best {best * 1000:.0f} ms, peak RSS +{peak / 1024:.1f} MB")
+
+# 子行程中量測啟動成本：匯入 app 並建立一次，回報時間、峰值 RSS 與已載入的重量級模組
+_STARTUP_PROBE = """
+import resource, sys, time
+start = time.perf_counter()
+from app import create_app
+create_app()
+elapsed = time.perf_counter() - start
+heavy = [m for m in ('boto3', 'botocore', 'PIL.Image', 'alembic', 'flask_migrate') if m in sys.modules]
+print('STARTUP', elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, ','.join(heavy))
+"""
+
+def _import_times(stderr, max_depth=4):
+    """解析 python -X importtime 的輸出，回傳 [(累計微秒, 模組)]，只包含前 max_depth 層的匯入"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # 每深一層多縮排兩個空白
+        depth = (len(name) - len(name.lstrip()) + 1) // 2
+        if depth <= max_depth:
+            rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)
+
+@perf_cli.command('startup')
+@click.option('--budget-ms', type=float, default=None, help='啟動時間上限，預設為 STARTUP_BUDGET_MS')
+@click.option('--top', type=int, default=15, show_default=True, help='列出最慢的最上層匯入數量')
+def startup(budget_ms, top):
+    """在乾淨的子行程中量測 worker 啟動（匯入 + create_app）的時間與記憶體，超過預算時回傳錯誤"""
+    budget_ms = budget_ms if budget_ms is not None else current_app.config['STARTUP_BUDGET_MS']
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', _STARTUP_PROBE],
+        cwd=os.path.dirname(current_app.root_path), capture_output=True, text=True
+    )
+    probe = [line for line in result.stdout.splitlines() if line.startswith('STARTUP ')]
+    if result.returncode != 0 or not probe:
+        raise click.ClickException(f"啟動失敗：\n{result.stderr[-2000:]}")
+    _, elapsed, max_rss, heavy = (probe[-1].split(' ') + [''])[:4]
+    elapsed_ms = float(elapsed) * 1000
+
+    for cumulative, name in _import_times(result.stderr)[:top]:
+        click.echo(f"{cumulative / 1000:8.1f} ms  {name}")
+    click.echo(f"Startup: {elapsed_ms:.0f} ms (with -X importtime overhead), peak RSS {int(max_rss) / 1024:.1f} MB")
+    click.echo(f"Heavy modules loaded at startup: {heavy or 'none'}")
+    if elapsed_ms > budget_ms:
+        raise click.ClickException(f"啟動時間 {elapsed_ms:.0f} ms 超過預算 {budget_ms:.0f} ms")
+    click.echo(f"Within budget ({budget_ms:.0f} ms)")
+
+@assets_cli.command('build')
+@with_appcontext
+def build():
+    """打包、壓縮 JS / CSS，以內容雜湊命名並產生 gzip / brotli 版本到 static/dist"""
+    report = build_assets(current_app.static_folder)
+    for name, info in report.items():
+        compressed = ', '.join(f"{enc}={info[enc]}" for enc in ('gzip', 'br') if enc in info)
+        click.echo(f"{name} -> {info['file']}: {info['source']} -> {info['bytes']} bytes ({compressed})")
+    click.echo('重新啟動後生效')
+
+def register_commands(app):
+    """註冊 flask CLI 指令"""
+    app.cli.add_command(images_cli)
+    app.cli.add_command(perf_cli)
+    app.cli.add_command(assets_cli)
@@ -3,9 +3,40 @@ from pathlib import Path
 
 basedir = Path(__file__).parent.parent
 
+def engine_options(uri, read_only=False):
+    """SQLAlchemy create_engine 參數；SQLite 沿用預設的連線池，其餘資料庫套用 DB_* 設定
+
+    查詢時間上限（DB_STATEMENT_TIMEOUT_MS）不在這裡設定：同一個 engine 也給 migration 與 CLI 使用，
+    只有請求中的交易才套用，見 utils.database。
+    """
+    if not uri or uri.startswith('sqlite'):
+        return {}
+    options = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true',
+        'pool_use_lifo': True,   # 閒置連線集中在少數幾條，其餘的可以被 recycle 掉
+    }
+    if uri.startswith(('postgres://', 'postgresql')):
+        options['connect_args'] = {'connect_timeout': int(os.environ.get('DB_CONNECT_TIMEOUT', 5))}
+        if read_only:
+            options['connect_args']['options'] = '-c default_transaction_read_only=on'
+    return options
+
+def replica_binds():
+    """設定 DATABASE_REPLICA_URL 時加入唯讀副本的 bind，列表與統計查詢會改用它"""
+    url = os.environ.get('DATABASE_REPLICA_URL')
+    if not url:
+        return {}
+    return {'replica': {'url': url, **engine_options(url, read_only=True)}}
+
 class BaseConfig:
     SECRET_KEY = os.environ.get('SECRET_KEY', 'change-this')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # 請求中每個查詢的最長毫秒數（Postgres），migration、CLI 與背景工作不受限制；0 表示不限制
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 5000))
     
     # Cloudflare R2
     R2_ACCESS_KEY_ID = os.environ.get('R2_ACCESS_KEY_ID')
@@ -13,12 +44,110 @@ class BaseConfig:
     R2_BUCKET_NAME = os.environ.get('R2_BUCKET_NAME')
     R2_ENDPOINT_URL = os.environ.get('R2_ENDPOINT_URL')
 
+    # 圖片網址：設定公開網址（公開 bucket 或 CDN）時不再產生 presigned URL
+    R2_PUBLIC_BASE_URL = os.environ.get('R2_PUBLIC_BASE_URL')
+    R2_PRESIGN_EXPIRES = int(os.environ.get('R2_PRESIGN_EXPIRES', 7 * 24 * 3600))
+    R2_PRESIGN_REFRESH_MARGIN = int(os.environ.get('R2_PRESIGN_REFRESH_MARGIN', 24 * 3600))
+    R2_URL_CACHE_SIZE = int(os.environ.get('R2_URL_CACHE_SIZE', 10000))
+
+    # 相簿分頁：首頁面只渲染第一頁，其餘由前端透過 JSON API 逐頁載入
+    GALLERY_PAGE_SIZE = int(os.environ.get('GALLERY_PAGE_SIZE', 30))
+    GALLERY_PAGE_MAX = int(os.environ.get('GALLERY_PAGE_MAX', 100))
+
+    # 使用 flask assets build 產生的打包檔；未建置或停用時載入 static 原始檔
+    ASSETS_ENABLED = os.environ.get('ASSETS_ENABLED', 'true').lower() == 'true'
+
+    # 日誌：LOG_FORMAT=json 輸出結構化紀錄；LOG_QUEUE 讓請求中不做磁碟 I/O
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')
+    LOG_QUEUE = os.environ.get('LOG_QUEUE', 'true').lower() == 'true'
+    # 預設只輸出到 console（stdout 由平台或 process manager 收集）；設定 LOG_FILE 時多個 worker 以 append 寫入同一個檔案，
+    # 輪替交給 logrotate 等外部工具。LOG_FILE_ROTATION=internal 改為行程內依大小輪替，只適用單一行程（例如 flask run）
+    LOG_FILE = os.environ.get('LOG_FILE', '')
+    LOG_FILE_ROTATION = os.environ.get('LOG_FILE_ROTATION', 'external')
+    LOG_FILE_MAX_BYTES = int(os.environ.get('LOG_FILE_MAX_BYTES', 1024 * 1024))
+    LOG_FILE_BACKUP_COUNT = int(os.environ.get('LOG_FILE_BACKUP_COUNT', 5))
+    # DEBUG 紀錄的取樣比例（以請求為單位）
+    LOG_DEBUG_SAMPLE_RATE = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', 1.0))
+
+    # flask perf startup 的啟動時間預算（毫秒，含 -X importtime 的額外開銷）
+    STARTUP_BUDGET_MS = float(os.environ.get('STARTUP_BUDGET_MS', 1500))
+
+    # 請求、SQL、模板與 R2 的耗時量測；SERVER_TIMING_HEADER 控制是否在回應中附上 Server-Timing
+    TIMING_ENABLED = os.environ.get('TIMING_ENABLED', 'true').lower() == 'true'
+    SERVER_TIMING_HEADER = os.environ.get('SERVER_TIMING_HEADER', 'true').lower() == 'true'
+
+    # 相簿頁面依資料版本號回應 ETag / 304
+    HTTP_CACHE_ENABLED = os.environ.get('HTTP_CACHE_ENABLED', 'true').lower() == 'true'
+
+    # 相簿卡片的 HTML 片段快取；FRAGMENT_CACHE_URL 留空使用行程內 LRU，或填 redis://host:6379/0
+    FRAGMENT_CACHE_ENABLED = os.environ.get('FRAGMENT_CACHE_ENABLED', 'true').lower() == 'true'
+    FRAGMENT_CACHE_URL = os.environ.get('FRAGMENT_CACHE_URL', '')
+    FRAGMENT_CACHE_SIZE = int(os.environ.get('FRAGMENT_CACHE_SIZE', 4096))
+    FRAGMENT_CACHE_TTL = int(os.environ.get('FRAGMENT_CACHE_TTL', 24 * 3600))
+
+    # 背景工作佇列：上傳的縮圖/上傳與 R2 刪除改在背景執行緒完成
+    JOB_QUEUE_ENABLED = os.environ.get('JOB_QUEUE_ENABLED', 'true').lower() == 'true'
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+    JOB_MAX_RETRIES = int(os.environ.get('JOB_MAX_RETRIES', 3))
+    JOB_RETRY_BACKOFF = float(os.environ.get('JOB_RETRY_BACKOFF', 2))
+    JOB_SHUTDOWN_TIMEOUT = float(os.environ.get('JOB_SHUTDOWN_TIMEOUT', 30))
+    # 佇列只在記憶體中：超過 PENDING_TIMEOUT 秒仍在處理中的上傳，每個 worker 每 PENDING_RECONCILE_INTERVAL 秒
+    # 檢查一次，能取回原檔的重新處理，其餘標記失敗（0 表示不定期檢查，可改用 flask images reconcile）
+    PENDING_TIMEOUT = int(os.environ.get('PENDING_TIMEOUT', 900))
+    PENDING_RECONCILE_INTERVAL = int(os.environ.get('PENDING_RECONCILE_INTERVAL', 300))
+
+    # 瀏覽器直傳：檔案以 presigned PUT 直接送到 bucket 的 incoming/，伺服器只處理中繼資料
+    # （需在 bucket 設定允許網站來源 PUT 的 CORS 規則，建議再替 incoming/ 設定過期刪除）
+    DIRECT_UPLOAD_ENABLED = os.environ.get('DIRECT_UPLOAD_ENABLED', 'false').lower() == 'true'
+    DIRECT_UPLOAD_EXPIRES = int(os.environ.get('DIRECT_UPLOAD_EXPIRES', 600))
+    DIRECT_UPLOAD_MAX_SIZE = int(os.environ.get('DIRECT_UPLOAD_MAX_SIZE', 20 * 1024 * 1024))
+    DIRECT_UPLOAD_MAX_FILES = int(os.environ.get('DIRECT_UPLOAD_MAX_FILES', 50))
+
+    # 相似照片：感知雜湊的漢明距離小於等於此值時記錄為相似（0 表示不檢查）
+    NEAR_DUPLICATE_DISTANCE = int(os.environ.get('NEAR_DUPLICATE_DISTANCE', 6))
+
+    # 相簿 ZIP 下載：每次從 R2 讀取的位元組數，以及預先開啟的後續物件數
+    EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 256 * 1024))
+    EXPORT_PREFETCH = int(os.environ.get('EXPORT_PREFETCH', 2))
+
+    # 批次刪除 API 每次最多的照片數
+    BULK_DELETE_MAX = int(os.environ.get('BULK_DELETE_MAX', 500))
+
+    # 統計快取秒數（本行程寫入會立即失效，此值是其他 worker 寫入的最長延遲）
+    STATS_CACHE_TTL = int(os.environ.get('STATS_CACHE_TTL', 60))
+
+    # R2 連線池設定（每個 worker 共用一個 client）
+    R2_MAX_POOL_CONNECTIONS = int(os.environ.get('R2_MAX_POOL_CONNECTIONS', 20))
+    R2_CONNECT_TIMEOUT = float(os.environ.get('R2_CONNECT_TIMEOUT', 5))
+    R2_READ_TIMEOUT = float(os.environ.get('R2_READ_TIMEOUT', 60))
+    R2_MAX_ATTEMPTS = int(os.environ.get('R2_MAX_ATTEMPTS', 3))
+    R2_TCP_KEEPALIVE = os.environ.get('R2_TCP_KEEPALIVE', 'true').lower() == 'true'
+
+    # 批次上傳時同時處理的檔案數
+    UPLOAD_WORKERS = int(os.environ.get('UPLOAD_WORKERS', 4))
+    # 編碼後的圖片超過此大小 (bytes) 才會寫入暫存檔，否則全程留在記憶體
+    UPLOAD_SPOOL_MAX_SIZE = int(os.environ.get('UPLOAD_SPOOL_MAX_SIZE', 8 * 1024 * 1024))
+    # 每張圖片產生的寬度（px），最大的那個就是主圖 object_key
+    IMAGE_VARIANT_WIDTHS = tuple(
+        int(w) for w in os.environ.get('IMAGE_VARIANT_WIDTHS', '256,640,1024').split(',')
+    )
+    # 超過此像素數的圖片直接拒絕，不解碼（防止解壓縮炸彈吃光記憶體）
+    IMAGE_MAX_PIXELS = int(os.environ.get('IMAGE_MAX_PIXELS', 80_000_000))
+    # 另外產生的新格式，Pillow 不支援的會自動略過
+    IMAGE_MODERN_FORMATS = tuple(
+        f.strip().upper() for f in os.environ.get('IMAGE_MODERN_FORMATS', 'AVIF,WEBP').split(',') if f.strip()
+    )
+
 class DevelopmentConfig(BaseConfig):
     DEBUG = True
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or f"sqlite:///{basedir / 'dev.db'}"
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    SQLALCHEMY_BINDS = replica_binds()
 
 class ProductionConfig(BaseConfig):
     DEBUG = False
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    SQLALCHEMY_BINDS = replica_binds()
 
     #########################for test
\ No newline at end of file
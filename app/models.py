@@ -1,14 +1,54 @@
 from .extensions import db
 from datetime import datetime
 
+# 感知雜湊（16 個十六進位字元）切成 8 段、每段 2 個字元並各自建立索引；
+# 漢明距離不超過 7 的兩個雜湊至少有一段完全相同，找相似照片時只需比對這些候選
+PHASH_BANDS = 8
+
+def phash_band(column, index):
+    """第 index 段的 SQL 運算式；位置寫成常數，查詢與索引的運算式才會一致而能使用索引"""
+    return db.func.substr(column, db.literal_column(str(index * 2 + 1)), db.literal_column('2'))
+
+# 照片處理狀態：背景工作完成縮圖與上傳前為 pending
+STATUS_PENDING = 'pending'
+STATUS_READY = 'ready'
+STATUS_FAILED = 'failed'
+
+class CollectionVersion(db.Model):
+    """每個照片資料表的版本號，任何新增、修改、刪除都會在同一個交易中遞增（見 utils.http_cache）"""
+    __tablename__ = 'collection_version'
+
+    name = db.Column(db.String(32), primary_key=True)           # 資料表名稱，例如 photo / birth_photo
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
 class Photo(db.Model):
+    __table_args__ = (
+        # 回憶膠卷依上傳時間排序與分頁
+        db.Index('ix_photo_uploaded_at_id', 'uploaded_at', 'id'),
+        # 上傳時依內容雜湊找出重複照片
+        db.Index('ix_photo_content_hash', 'content_hash'),
+        # 刪除時計算 R2 物件的參照數
+        db.Index('ix_photo_object_key', 'object_key'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     object_key = db.Column(db.String(512), nullable=False)
     url = db.Column(db.String(1024), nullable=False)
-    uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
+    variants = db.Column(db.JSON, nullable=True)                # 各尺寸衍生圖 [{key, width, format, bytes}]
+    status = db.Column(db.String(16), nullable=False, default=STATUS_READY, server_default=STATUS_READY)
+    content_hash = db.Column(db.String(64), nullable=True)     # 原檔 sha256，同內容的照片共用 R2 物件
+    phash = db.Column(db.String(16), nullable=True)            # 感知雜湊 (dHash)，用來找出相似照片
+    uploaded_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
 class BirthPhoto(db.Model):
     __tablename__ = 'birth_photo'
+    __table_args__ = (
+        # 年份篩選、DISTINCT 年份，以及 (年份, 上傳時間) 排序與分頁
+        db.Index('ix_birth_photo_year_uploaded_at_id', 'birthday_year', 'uploaded_at', 'id'),
+        db.Index('ix_birth_photo_content_hash', 'content_hash'),
+        db.Index('ix_birth_photo_object_key', 'object_key'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     object_key = db.Column(db.String(512), nullable=False)
@@ -16,7 +56,11 @@ class BirthPhoto(db.Model):
     birthday_year = db.Column(db.Integer, nullable=False)      # 生日年份 (必填)
     birthday_date = db.Column(db.String(10), nullable=False)   # 🆕 生日日期 (MM-DD 格式，如 "01-01" 或 "06-26")
     description = db.Column(db.Text, nullable=True)            # 照片描述
-    uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
+    variants = db.Column(db.JSON, nullable=True)               # 各尺寸衍生圖 [{key, width, format, bytes}]
+    status = db.Column(db.String(16), nullable=False, default=STATUS_READY, server_default=STATUS_READY)  # pending / ready / failed
+    content_hash = db.Column(db.String(64), nullable=True)     # 原檔 sha256，同內容的照片共用 R2 物件
+    phash = db.Column(db.String(16), nullable=True)            # 感知雜湊 (dHash)，用來找出相似照片
+    uploaded_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     
     # 🆕 生日配置常數
     BIRTH_DATES = {
@@ -53,4 +97,8 @@ class BirthPhoto(db.Model):
         return f"{self.birthday_year}年{birthday_name} - {age_text}"
     
     def __repr__(self):
-        return f'<BirthPhoto {self.id}: {self.birthday_year}年{self.birthday_date}>'
\ No newline at end of file
+        return f'<BirthPhoto {self.id}: {self.birthday_year}年{self.birthday_date}>'
+
+for _model in (Photo, BirthPhoto):
+    for _index in range(PHASH_BANDS):
+        db.Index(f'ix_{_model.__tablename__}_phash_b{_index}', phash_band(_model.phash, _index))
@@ -1,54 +1,88 @@
-from .storage import upload_image, delete_image, allowed_file
+from .storage import allowed_file
+from .image_jobs import save_uploads, register_direct_uploads, release_image_later, delete_rows
 from ..extensions import db
 from ..models import BirthPhoto
+from ..utils.pagination import encode_cursor, decode_cursor
+from ..utils.cache import app_cache
+from ..utils.database import read_session
 from flask import current_app
+from sqlalchemy import tuple_, func
 from datetime import datetime
 
-def save_birthday_photo(file_storage, birthday_year=None, birthday_date=None, description=None):
-    """保存生日照片"""
-    filename = file_storage.filename
-    if not allowed_file(filename):
-        current_app.logger.warning(f"Unsupported format: {filename}")
-        raise ValueError("不支援的檔案格式")
-    
-    current_app.logger.debug(f"Saving birthday photo: {filename}")
-    object_key, url = upload_image(file_storage)
-    
-    # 如果沒有指定年份，使用當前年份
+def save_birthday_photos(file_storages, birthday_year=None, birthday_date=None, description=None):
+    """批次保存生日照片：並行縮圖與上傳，再以單一交易寫入所有紀錄
+
+    回傳 [(file_storage, error)]，順序與輸入相同；error 為 None 代表成功，
+    生日相簿中已有相同照片時為 DuplicateUpload。
+    啟用 JOB_QUEUE_ENABLED 時只寫入 pending 紀錄，縮圖與上傳交給背景工作。
+    """
     if birthday_year is None:
         birthday_year = datetime.now().year
-    
-    # 🔧 修復：如果沒有指定生日日期，使用預設值
     if birthday_date is None:
-        # 可以根據年份或其他邏輯設定預設生日日期
-        # 這裡使用一個通用的預設值
-        birthday_date = "01-01"  # 預設為1月1日
-    
-    birth_photo = BirthPhoto(
-        object_key=object_key, 
-        url=url,
+        birthday_date = "01-01"
+
+    results = [[fs, None] for fs in file_storages]
+    pending = []
+    for item in results:
+        filename = item[0].filename
+        if not allowed_file(filename):
+            current_app.logger.warning(f"Unsupported format: {filename}")
+            item[1] = ValueError("不支援的檔案格式")
+        else:
+            current_app.logger.debug(f"Saving birthday photo: {filename}")
+            pending.append(item)
+
+    if save_uploads(pending, lambda: BirthPhoto(
         birthday_year=birthday_year,
-        birthday_date=birthday_date,  # 🔧 確保不為 None
+        birthday_date=birthday_date,
         description=description
-    )
-    db.session.add(birth_photo)
-    db.session.commit()
-    
-    current_app.logger.info(f"Birthday photo record created: id={birth_photo.id}")
-    return birth_photo
+    )):
+        invalidate_birthday_stats()
+    return [tuple(item) for item in results]
+
+def register_uploaded_birthday_photos(incoming_keys, birthday_year, birthday_date, description=None):
+    """登記瀏覽器直傳完成的生日照片，回傳 [(incoming_key, photo_id, error)]"""
+    results = register_direct_uploads(incoming_keys, lambda: BirthPhoto(
+        birthday_year=birthday_year,
+        birthday_date=birthday_date,
+        description=description
+    ))
+    if any(photo_id for _, photo_id, _ in results):
+        invalidate_birthday_stats()
+    return results
 
 def list_birthday_photos():
     """獲取所有生日照片，按年份排序"""
-    return BirthPhoto.query.order_by(BirthPhoto.birthday_year.desc(), BirthPhoto.uploaded_at.desc()).all()
+    return read_session().query(BirthPhoto).order_by(BirthPhoto.birthday_year.desc(), BirthPhoto.uploaded_at.desc()).all()
+
+def list_birthday_photos_page(limit, cursor=None, year=None):
+    """依 (birthday_year, uploaded_at, id) 由新到舊做 keyset 分頁，回傳 (photos, next_cursor)
+
+    指定 year 時只取該年份；最後一頁的 next_cursor 為 None。
+    """
+    query = read_session().query(BirthPhoto)
+    if year is not None:
+        query = query.filter_by(birthday_year=year)
+    query = query.order_by(BirthPhoto.birthday_year.desc(), BirthPhoto.uploaded_at.desc(), BirthPhoto.id.desc())
+    if cursor:
+        cursor_year, uploaded_at, photo_id = decode_cursor(cursor, int, datetime, int)
+        query = query.filter(
+            tuple_(BirthPhoto.birthday_year, BirthPhoto.uploaded_at, BirthPhoto.id)
+            < tuple_(cursor_year, uploaded_at, photo_id)
+        )
+    photos = query.limit(limit + 1).all()
+    if len(photos) <= limit:
+        return photos, None
+    last = photos[limit - 1]
+    return photos[:limit], encode_cursor(last.birthday_year, last.uploaded_at, last.id)
 
 def get_birthday_photos_by_year(year):
     """獲取特定年份的生日照片"""
-    return BirthPhoto.query.filter_by(birthday_year=year).order_by(BirthPhoto.uploaded_at.desc()).all()
+    return read_session().query(BirthPhoto).filter_by(birthday_year=year).order_by(BirthPhoto.uploaded_at.desc()).all()
 
 def get_birthday_years():
-    """獲取所有有照片的生日年份"""
-    years = db.session.query(BirthPhoto.birthday_year).distinct().order_by(BirthPhoto.birthday_year.desc()).all()
-    return [year[0] for year in years if year[0] is not None]
+    """獲取所有有照片的生日年份（由新到舊）"""
+    return list(get_birthday_stats()['per_year'])
 
 def delete_birthday_photo(photo_id):
     """刪除生日照片"""
@@ -57,23 +91,56 @@ def delete_birthday_photo(photo_id):
         current_app.logger.warning(f"Birthday photo id {photo_id} not found")
         return False
     
+    object_key, variants = photo.object_key, photo.variants
+    db.session.delete(photo)
+    db.session.commit()
+    invalidate_birthday_stats()
+    
+    # 紀錄刪除後才釋放 R2 物件，其他照片仍共用時會保留
     try:
-        delete_image(photo.object_key)
+        release_image_later(object_key, variants)
     except Exception:
         current_app.logger.error(f"Error deleting image from storage for birthday photo id={photo_id}")
-    
-    db.session.delete(photo)
-    db.session.commit()
     current_app.logger.info(f"Birthday photo record deleted: id={photo_id}")
     return True
 
-def get_birthday_stats():
-    """獲取生日照片統計"""
-    total_photos = BirthPhoto.query.count()
-    years_count = len(get_birthday_years())
-    
+def delete_birthday_photos(photo_ids):
+    """批次刪除生日照片，回傳 (deleted_ids, missing_ids, storage_failures)，見 delete_rows"""
+    deleted, missing, failures = delete_rows(BirthPhoto, photo_ids)
+    if deleted:
+        invalidate_birthday_stats()
+    return deleted, missing, failures
+
+def _stats_cache():
+    return app_cache('birthday_stats', maxsize=1)
+
+def invalidate_birthday_stats():
+    """生日照片新增或刪除後清除統計快取"""
+    _stats_cache().clear()
+
+def _query_birthday_stats():
+    # 一次 GROUP BY 取得每個年份的照片數，其餘統計都由此推得
+    rows = (
+        read_session().query(BirthPhoto.birthday_year, func.count(BirthPhoto.id))
+        .group_by(BirthPhoto.birthday_year)
+        .order_by(BirthPhoto.birthday_year.desc())
+        .all()
+    )
+    per_year = {year: count for year, count in rows if year is not None}
     return {
-        'total_photos': total_photos,
-        'years_count': years_count,
-        'latest_year': max(get_birthday_years()) if years_count > 0 else None
-    }
\ No newline at end of file
+        'total_photos': sum(count for _, count in rows),
+        'years_count': len(per_year),
+        'latest_year': max(per_year) if per_year else None,
+        'per_year': per_year,
+    }
+
+def get_birthday_stats():
+    """獲取生日照片統計
+
+    結果快取在行程內，本行程寫入時立即失效；其他 worker 的寫入最多延遲
+    STATS_CACHE_TTL 秒才會反映。
+    """
+    stats = _stats_cache().get_or_set(
+        'stats', _query_birthday_stats, ttl=current_app.config.get('STATS_CACHE_TTL', 60)
+    )
+    return dict(stats)
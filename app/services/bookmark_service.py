@@ -1,84 +1,118 @@
+import hashlib
 from datetime import datetime
-from typing import List, Dict
-from ..services.photo_service import list_photos
+from typing import Callable, List, Optional
+from ..models import Photo, BirthPhoto
+from ..services.photo_service import count_photos
 from ..services.birthday_service import get_birthday_stats
 
 class BookmarkConfig:
-    """書籤配置類"""
+    """書籤配置類
+
+    describe 是動態描述（例如照片數量）的產生函式，只有 show_count=True 時才會在
+    讀取 description 的當下呼叫，其餘情況完全不查詢資料庫。
+    models 是 describe 讀取的資料表，主畫面的 ETag 只在 show_count=True 時跟著它們的版本號變動。
+    """
     def __init__(self, id: str, title: str, icon: str, color: str, 
                  route: str, description: str = "", enabled: bool = True,
-                 date: str = None):
+                 date: str = None, describe: Optional[Callable[[], str]] = None,
+                 show_count: bool = False, models: tuple = ()):
         self.id = id
         self.title = title
         self.icon = icon
         self.color = color
         self.route = route
-        self.description = description
+        self._description = description
         self.enabled = enabled
         self.date = date or datetime.now().strftime('%Y.%m')
+        self.describe = describe
+        self.show_count = show_count
+        self.models = models
 
-def get_all_bookmarks() -> List[BookmarkConfig]:
-    """獲取所有可用的書籤"""
-    
+    @property
+    def description(self) -> str:
+        if self.show_count and self.describe is not None:
+            return self.describe()
+        return self._description
+
+def _memory_description() -> str:
     # 動態獲取回憶膠卷的照片數量
-    photos = list_photos()
-    photo_count = len(photos)
-    memory_description = f"{photo_count} 個珍貴回憶" if photo_count > 0 else "等待你的第一段回憶"
-    
+    photo_count = count_photos()
+    return f"{photo_count} 個珍貴回憶" if photo_count > 0 else "等待你的第一段回憶"
+
+def _birthday_description() -> str:
     # 🎂 動態獲取生日照片統計
     birthday_stats = get_birthday_stats()
     if birthday_stats['total_photos'] > 0:
         if birthday_stats['years_count'] > 1:
-            birthday_description = f"{birthday_stats['years_count']} 年的生日回憶"
-        else:
-            birthday_description = f"{birthday_stats['total_photos']} 個生日時刻"
-    else:
-        birthday_description = "記錄每年的生日時光"
-    
-    bookmarks = [
-        BookmarkConfig(
-            id="memory_film",
-            title="回憶膠卷",
-            icon="🎞️",
-            color="#FF6B6B",
-            route="memory.index",
-            description="",
-            #description=memory_description,
-            date="隨時隨地"
-        ),
-        BookmarkConfig(
-            id="birthday",
-            title="生日",
-            icon="🎂",
-            color="#4ECDC4", 
-            route="birthday.index",  # 🎂 修正路由名稱
-            description="",
-            #description=birthday_description,
-            enabled=True,  # 🎂 啟用生日功能
-            date="06.26/01.01"
-        ),
-        BookmarkConfig(
-            id="anniversary",
-            title="開發中",
-            icon="🗺️",
-            color="#45B7D1",
-            route="anniversary.index", 
-            description="",
-            enabled=False,  # 未啟用功能
-            date=" "
-        )
-    ]
-    
-    return bookmarks
+            return f"{birthday_stats['years_count']} 年的生日回憶"
+        return f"{birthday_stats['total_photos']} 個生日時刻"
+    return "記錄每年的生日時光"
+
+# 書籤在模組載入時建立一次；要在書籤上顯示數量時把 show_count 設為 True
+BOOKMARKS: List[BookmarkConfig] = [
+    BookmarkConfig(
+        id="memory_film",
+        title="回憶膠卷",
+        icon="🎞️",
+        color="#FF6B6B",
+        route="memory.index",
+        description="",
+        describe=_memory_description,
+        show_count=False,
+        models=(Photo,),
+        date="隨時隨地"
+    ),
+    BookmarkConfig(
+        id="birthday",
+        title="生日",
+        icon="🎂",
+        color="#4ECDC4", 
+        route="birthday.index",  # 🎂 修正路由名稱
+        description="",
+        describe=_birthday_description,
+        show_count=False,
+        models=(BirthPhoto,),
+        enabled=True,  # 🎂 啟用生日功能
+        date="06.26/01.01"
+    ),
+    BookmarkConfig(
+        id="anniversary",
+        title="開發中",
+        icon="🗺️",
+        color="#45B7D1",
+        route="anniversary.index", 
+        description="",
+        enabled=False,  # 未啟用功能
+        date=" "
+    )
+]
+
+_BOOKMARKS_BY_ID = {bookmark.id: bookmark for bookmark in BOOKMARKS}
+
+def counted_models() -> tuple:
+    """顯示數量的書籤所讀取的資料表；都不顯示數量時為空，主畫面不需要查詢資料庫"""
+    models = []
+    for bookmark in BOOKMARKS:
+        if bookmark.show_count and bookmark.describe is not None:
+            models.extend(model for model in bookmark.models if model not in models)
+    return tuple(models)
+
+def registry_fingerprint() -> str:
+    """書籤設定的摘要，書籤內容改變（重新部署）時主畫面的 ETag 跟著改變"""
+    digest = hashlib.sha1()
+    for bookmark in BOOKMARKS:
+        digest.update(repr((bookmark.id, bookmark.title, bookmark.icon, bookmark.color, bookmark.route,
+                            bookmark._description, bookmark.enabled, bookmark.date, bookmark.show_count)).encode())
+    return digest.hexdigest()[:16]
+
+def get_all_bookmarks() -> List[BookmarkConfig]:
+    """獲取所有可用的書籤"""
+    return list(BOOKMARKS)
 
 def get_bookmark_by_id(bookmark_id: str) -> BookmarkConfig:
     """根據ID獲取特定書籤"""
-    bookmarks = get_all_bookmarks()
-    for bookmark in bookmarks:
-        if bookmark.id == bookmark_id:
-            return bookmark
-    return None
+    return _BOOKMARKS_BY_ID.get(bookmark_id)
 
 def get_enabled_bookmarks() -> List[BookmarkConfig]:
     """只獲取已啟用的書籤"""
-    return [bookmark for bookmark in get_all_bookmarks() if bookmark.enabled]
\ No newline at end of file
+    return [bookmark for bookmark in BOOKMARKS if bookmark.enabled]
@@ -0,0 +1,156 @@
+import hashlib
+from flask import current_app
+from sqlalchemy import func, or_, text
+from .storage import delete_image, delete_objects, image_keys
+from .imaging import hamming_distance
+from ..extensions import db
+from ..models import Photo, BirthPhoto, STATUS_PENDING, STATUS_FAILED, PHASH_BANDS, phash_band
+from ..utils import metrics
+
+# 這些資料表的照片以內容雜湊命名，可能共用同一組 R2 物件
+MODELS = (Photo, BirthPhoto)
+
+class DuplicateUpload(ValueError):
+    """同一個相簿已經有相同內容的照片"""
+    def __init__(self, message='照片已存在，已略過重複上傳'):
+        super().__init__(message)
+
+def find_duplicate(model, content_hash, exclude_id=None):
+    """找出同一個相簿中相同內容、且未處理失敗的照片"""
+    query = model.query.filter(model.content_hash == content_hash, model.status != STATUS_FAILED)
+    if exclude_id is not None:
+        query = query.filter(model.id != exclude_id)
+    return query.first()
+
+def find_reusable(content_hash, exclude=None):
+    """找出任一相簿中相同內容的照片，新紀錄可直接共用它的 R2 物件"""
+    for model in MODELS:
+        row = find_duplicate(model, content_hash, exclude.id if type(exclude) is model else None)
+        if row is not None:
+            return row
+    return None
+
+def lock_objects(object_keys):
+    """以交易層級的 advisory lock 鎖住這些 R2 物件，直到目前的交易結束
+
+    共用物件的上傳與 release_image 都先取得鎖，參照數的檢查與刪除才不會和新紀錄的寫入交錯。
+    只在 PostgreSQL 上有作用；SQLite 只用於單一行程的本地開發。
+    """
+    if db.session.get_bind().dialect.name != 'postgresql':
+        return
+    for object_key in sorted(set(object_keys)):
+        lock_id = int.from_bytes(hashlib.sha256(object_key.encode()).digest()[:8], 'big', signed=True)
+        db.session.execute(text('SELECT pg_advisory_xact_lock(:id)'), {'id': lock_id})
+
+def claim_reusable(content_hash, exclude=None):
+    """find_reusable 並鎖住找到的物件，本交易提交前它不會被 release_image 刪除
+
+    取得鎖之後重新查詢：等待期間來源照片可能已被刪除，或改由其他照片共用另一組物件。
+    """
+    locked = set()
+    while True:
+        row = find_reusable(content_hash, exclude)
+        if row is None or row.object_key in locked:
+            return row
+        lock_objects([row.object_key])
+        locked.add(row.object_key)
+
+def share_objects(row, source):
+    """讓 row 參照 source 的 R2 物件，不重新縮圖上傳"""
+    row.object_key = source.object_key
+    row.url = source.url
+    row.variants = source.variants
+    row.phash = source.phash
+    row.status = source.status
+    metrics.inc('upload_duplicates_shared')
+
+def rows_for_object(object_key, status=None):
+    """所有參照此 object_key 的紀錄（跨相簿）"""
+    rows = []
+    for model in MODELS:
+        query = model.query.filter(model.object_key == object_key)
+        if status is not None:
+            query = query.filter(model.status == status)
+        rows.extend(query.all())
+    return rows
+
+def count_references(object_key):
+    """參照此 object_key 的紀錄數（跨相簿）"""
+    return sum(
+        db.session.query(func.count(model.id)).filter(model.object_key == object_key).scalar()
+        for model in MODELS
+    )
+
+def release_image(object_key, variants=None):
+    """沒有任何紀錄參照時才刪除 R2 上的圖片；必須在刪除紀錄的交易提交之後呼叫
+
+    檢查參照數到刪除完成之間持有物件的鎖，同時共用這組物件的上傳會等到刪除完成後重新上傳。
+    """
+    lock_objects([object_key])
+    try:
+        references = count_references(object_key)
+        if references:
+            current_app.logger.debug(f"Keeping {object_key}, still referenced by {references} photos")
+            metrics.inc('storage_deletes_skipped_shared')
+            return False
+        delete_image(object_key, variants)
+        return True
+    finally:
+        # 結束交易以釋放鎖（這裡沒有寫入）
+        db.session.rollback()
+
+# IN 查詢每批的 key 數，避免超過資料庫的參數上限
+_IN_CHUNK = 500
+
+def referenced_keys(object_keys):
+    """仍被任何紀錄參照的 object_key 集合（跨相簿）"""
+    keys = list(set(object_keys))
+    found = set()
+    for start in range(0, len(keys), _IN_CHUNK):
+        chunk = keys[start:start + _IN_CHUNK]
+        for model in MODELS:
+            query = db.session.query(model.object_key).filter(model.object_key.in_(chunk)).distinct()
+            found.update(key for (key,) in query)
+    return found
+
+def release_images(images):
+    """批次版的 release_image：images 為 [(object_key, variants)]，回傳 {key: 錯誤訊息}"""
+    lock_objects(object_key for object_key, _ in images)
+    try:
+        referenced = referenced_keys(object_key for object_key, _ in images)
+        keys = []
+        for object_key, variants in images:
+            if object_key in referenced:
+                metrics.inc('storage_deletes_skipped_shared')
+                continue
+            keys.extend(image_keys(object_key, variants))
+        return delete_objects(keys) if keys else {}
+    finally:
+        db.session.rollback()
+
+def mark_pending_failed(object_key):
+    """處理失敗時，把所有等待這組 R2 物件的紀錄標記為失敗"""
+    for row in rows_for_object(object_key, STATUS_PENDING):
+        row.status = STATUS_FAILED
+
+def find_near_duplicates(model, phash, exclude_id=None, max_distance=None):
+    """同一個相簿中感知雜湊相近的照片，回傳 [(id, 距離)]，依距離排序
+
+    max_distance 小於 PHASH_BANDS 時，只以索引取出至少有一段雜湊完全相同的候選再計算距離，
+    結果與逐一比對相同；更大的距離才需要掃描整個相簿。
+    """
+    if max_distance is None:
+        max_distance = current_app.config.get('NEAR_DUPLICATE_DISTANCE', 6)
+    query = db.session.query(model.id, model.phash).filter(model.phash.isnot(None))
+    if exclude_id is not None:
+        query = query.filter(model.id != exclude_id)
+    if max_distance < PHASH_BANDS:
+        query = query.filter(or_(*(
+            phash_band(model.phash, i) == phash[i * 2:i * 2 + 2] for i in range(PHASH_BANDS)
+        )))
+    matches = []
+    for photo_id, other in query:
+        distance = hamming_distance(phash, other)
+        if distance <= max_distance:
+            matches.append((photo_id, distance))
+    return sorted(matches, key=lambda match: match[1])
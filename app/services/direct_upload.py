@@ -0,0 +1,24 @@
+from flask import current_app
+from .storage import presign_uploads
+
+def presign_request(data):
+    """直傳 API 的 presign：data 為請求的 JSON，回傳給瀏覽器的 [{filename, key, url, method, headers} 或 {filename, error}]"""
+    filenames = data.get('filenames') or []
+    return presign_uploads([str(name) for name in filenames])
+
+def complete_request(data, register):
+    """直傳 API 的 complete：以 register(keys) 登記 data['keys']（最多 DIRECT_UPLOAD_MAX_FILES 個）
+
+    register 回傳 [(incoming_key, photo_id, error)]，例如 register_uploaded_photos；
+    結果轉成 API 回應的 [{key, id, error?}]，非預期的錯誤只記錄在日誌中，不把細節回給瀏覽器。
+    """
+    keys = (data.get('keys') or [])[:current_app.config['DIRECT_UPLOAD_MAX_FILES']]
+    items = []
+    for key, photo_id, error in register(keys):
+        item = {'key': key, 'id': photo_id}
+        if error is not None:
+            if not isinstance(error, ValueError):
+                current_app.logger.error(f"Direct upload registration failed for {key}", exc_info=error)
+            item['error'] = str(error) if isinstance(error, ValueError) else '處理失敗'
+        items.append(item)
+    return items
@@ -0,0 +1,137 @@
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from flask import Response, current_app, stream_with_context
+from .storage import get_r2_client
+from ..extensions import db
+from ..models import STATUS_READY
+from ..utils import metrics
+from ..utils.database import read_session
+
+class _StreamSink:
+    """zipfile 的輸出目的地：不可 seek，只暫存尚未送出的位元組"""
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def iter_rows(fetch_page, batch_size=200):
+    """以 keyset 分頁逐批取出照片，每批之間釋放資料庫連線，長時間的下載不會佔住連線池
+
+    fetch_page(limit, cursor) 回傳 (rows, next_cursor)，例如 list_photos_page。
+    """
+    cursor = None
+    while True:
+        rows, cursor = fetch_page(batch_size, cursor)
+        # 列表查詢可能走唯讀副本，兩邊的連線都要歸還
+        read_session().close()
+        db.session.close()
+        yield from rows
+        if not cursor:
+            return
+
+def export_entries(photos, folder=''):
+    """把照片轉成 ZIP 項目 (檔名, object_key, 修改時間)，只包含處理完成的照片"""
+    index = 0
+    for photo in photos:
+        if photo.status != STATUS_READY:
+            continue
+        index += 1
+        ext = photo.object_key.rsplit('.', 1)[-1]
+        stamp = photo.uploaded_at.strftime('%Y%m%d_%H%M%S') if photo.uploaded_at else 'unknown'
+        yield f"{folder}{index:04d}_{stamp}.{ext}", photo.object_key, photo.uploaded_at
+
+def _fetch(client, bucket, object_key):
+    return client.get_object(Bucket=bucket, Key=object_key)
+
+def stream_zip(entries):
+    """邊從 R2 讀取邊產生 ZIP（不壓縮，照片本身已壓縮）
+
+    一次只讀 EXPORT_CHUNK_SIZE 位元組，並在背景先開啟接下來 EXPORT_PREFETCH 個物件的 GetObject，
+    記憶體用量與相簿大小無關。讀取失敗的檔案會列在 ZIP 最後的 errors.txt。
+    """
+    config = current_app.config
+    chunk_size = config.get('EXPORT_CHUNK_SIZE', 256 * 1024)
+    prefetch = max(1, config.get('EXPORT_PREFETCH', 2))
+    client = get_r2_client()
+    bucket = config['R2_BUCKET_NAME']
+    logger = current_app.logger
+
+    entries = iter(entries)
+    pending = deque()
+    failed = []
+    sink = _StreamSink()
+
+    def fill(pool):
+        while len(pending) < prefetch:
+            entry = next(entries, None)
+            if entry is None:
+                return
+            pending.append((entry, pool.submit(_fetch, client, bucket, entry[1])))
+
+    pool = ThreadPoolExecutor(max_workers=prefetch, thread_name_prefix='export')
+    try:
+        with zipfile.ZipFile(sink, mode='w', compression=zipfile.ZIP_STORED) as archive:
+            fill(pool)
+            while pending:
+                (name, object_key, modified), future = pending.popleft()
+                fill(pool)   # 寫入這個檔案的同時先開啟後面的物件
+                try:
+                    response = future.result()
+                except Exception as e:
+                    logger.warning(f"Export skipped {object_key}: {e}")
+                    failed.append(name)
+                    continue
+
+                info = zipfile.ZipInfo(name, date_time=modified.timetuple()[:6] if modified else (1980, 1, 1, 0, 0, 0))
+                info.compress_type = zipfile.ZIP_STORED
+                info.file_size = response['ContentLength']
+                body = response['Body']
+                try:
+                    with archive.open(info, mode='w') as dest:
+                        for chunk in body.iter_chunks(chunk_size):
+                            dest.write(chunk)
+                            data = sink.drain()
+                            if data:
+                                metrics.inc('export_bytes', len(data))
+                                yield data
+                except Exception as e:
+                    # 已經送出的部分無法收回，這個檔案會是截斷的
+                    logger.warning(f"Export of {object_key} interrupted: {e}")
+                    failed.append(name)
+                finally:
+                    body.close()
+                metrics.inc('export_files')
+
+            if failed:
+                archive.writestr('errors.txt', '以下檔案無法下載或不完整：\n' + '\n'.join(failed) + '\n')
+        # 剩下的本機檔頭與中央目錄
+        yield sink.drain()
+    finally:
+        # 用戶中途取消下載時，關閉已經開啟的物件
+        for _, future in pending:
+            if not future.cancel() and future.done() and future.exception() is None:
+                future.result()['Body'].close()
+        pool.shutdown(wait=False)
+
+def zip_response(entries, filename):
+    """以 ZIP 串流回應下載，不設定 Content-Length，也不在 worker 中暫存整個檔案"""
+    return Response(
+        stream_with_context(stream_zip(entries)),
+        mimetype='application/zip',
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'X-Accel-Buffering': 'no',   # 不讓 nginx 暫存整個回應
+            'Cache-Control': 'no-store',
+        }
+    )
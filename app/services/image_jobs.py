@@ -0,0 +1,329 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from .jobs import enqueue, jobs_enabled, schedule
+from .storage import (
+    process_image, upload_images, delete_image, delete_objects, buffer_upload, content_digest,
+    new_object_key, check_incoming, fetch_incoming, is_incoming_key
+)
+from .dedup import (
+    MODELS, DuplicateUpload, find_duplicate, claim_reusable, lock_objects, share_objects, rows_for_object,
+    release_image, release_images, mark_pending_failed, find_near_duplicates
+)
+from ..extensions import db
+from ..models import STATUS_PENDING, STATUS_READY, STATUS_FAILED
+from ..utils import metrics
+
+def _flag_near_duplicates(row):
+    """記錄同一個相簿中看起來相似的照片（NEAR_DUPLICATE_DISTANCE 為 0 時停用）"""
+    if not row.phash or not current_app.config.get('NEAR_DUPLICATE_DISTANCE'):
+        return
+    matches = find_near_duplicates(type(row), row.phash, exclude_id=row.id)
+    if matches:
+        metrics.inc('upload_near_duplicates')
+        current_app.logger.info(
+            f"{type(row).__name__} id={row.id} looks like ids {[photo_id for photo_id, _ in matches]}"
+        )
+
+def _process_upload(object_key, buffer, filename, stem):
+    """背景工作：縮圖、上傳，並把所有等待這組物件的紀錄標記為完成"""
+    object_key, url, variants, phash = process_image(buffer, filename, stem=stem)
+    rows = rows_for_object(object_key, STATUS_PENDING)
+    if not rows:
+        # 處理期間紀錄已被刪除，沒有其他照片共用時移除剛上傳的檔案
+        current_app.logger.info(f"{object_key} deleted while processing")
+        release_image(object_key, variants)
+        buffer.close()
+        return
+    for row in rows:
+        row.url = url
+        row.variants = variants
+        row.phash = phash
+        row.status = STATUS_READY
+    db.session.commit()
+    buffer.close()
+    current_app.logger.info(f"Processed {object_key} for {len(rows)} photos")
+    for row in rows:
+        _flag_near_duplicates(row)
+
+def _object_failure_handler(object_key, buffer):
+    """工作重試用盡時把等待這組物件的紀錄標記為失敗"""
+    def _mark_failed(error):
+        buffer.close()
+        mark_pending_failed(object_key)
+        db.session.commit()
+    return _mark_failed
+
+def _row_failure_handler(model, photo_id):
+    """工作重試用盡時把單筆紀錄標記為失敗（已由其他工作處理完成的不改）"""
+    def _mark_failed(error):
+        row = db.session.get(model, photo_id)
+        if row is not None and row.status == STATUS_PENDING:
+            row.status = STATUS_FAILED
+            db.session.commit()
+    return _mark_failed
+
+def _enqueue_upload(object_key, buffer, filename, stem):
+    enqueue(_process_upload, object_key, buffer, filename, stem,
+            on_failure=_object_failure_handler(object_key, buffer))
+
+def _process_incoming(model, photo_id, incoming_key):
+    """背景工作：從 bucket 取回瀏覽器直傳的原檔，依內容雜湊決定 key 後處理，完成後刪除 incoming 檔案
+
+    紀錄處理前的 object_key 就是 incoming key，reconcile_pending 可以據此重新排入工作；
+    同一筆紀錄被排入兩次時，後執行的看到紀錄已不是 pending 就只清理暫存檔。
+    """
+    row = db.session.get(model, photo_id)
+    if row is not None and row.status == STATUS_PENDING:
+        buffer = fetch_incoming(incoming_key)
+        digest = content_digest(buffer)
+        row.content_hash = digest
+        existing = claim_reusable(digest, exclude=row)
+        if existing is not None:
+            # 已經有相同內容的照片，直接共用不再縮圖
+            share_objects(row, existing)
+            db.session.commit()
+            buffer.close()
+        else:
+            stem, row.object_key = new_object_key(incoming_key, digest)
+            # 同一個 key 正在被 release_image 刪除時，等刪除完成後再寫入
+            lock_objects([row.object_key])
+            db.session.commit()
+            _process_upload(row.object_key, buffer, incoming_key, stem)
+    try:
+        delete_image(incoming_key)
+    except Exception:
+        # 已經處理完成，不為了暫存檔重跑整個工作；留給 bucket 的 lifecycle 規則清理
+        current_app.logger.warning(f"Leaving incoming object {incoming_key} behind")
+
+def save_uploads(items, make_row):
+    """保存上傳檔案：計算內容雜湊、略過重複，再縮圖上傳或交給背景工作
+
+    items 為 [[file_storage, error], ...]，只包含格式正確的檔案，失敗時會填入 error；
+    同一個相簿已有相同內容時 error 為 DuplicateUpload，其他相簿已有時直接共用 R2 物件。
+    make_row() 回傳只填好相簿欄位、尚未加入 session 的 ORM 物件。
+    啟用 JOB_QUEUE_ENABLED 時只寫入 pending 紀錄，否則在請求中並行處理完才寫入。
+    回傳成功寫入的筆數。
+    """
+    background = jobs_enabled()
+    staged = []    # (item, row, source)：source 是待處理的 buffer / file_storage，共用物件時為 None
+    seen = set()
+    for item in items:
+        file_storage = item[0]
+        try:
+            if background:
+                # 複製到暫存緩衝區時順便計算雜湊，不必多讀一次
+                source = buffer_upload(file_storage)
+                digest = source.content_hash
+            else:
+                source = file_storage
+                digest = content_digest(file_storage.stream)
+        except Exception as e:
+            item[1] = e
+            continue
+
+        row = make_row()
+        row.content_hash = digest
+        if digest in seen or find_duplicate(type(row), digest) is not None:
+            if background:
+                source.close()
+            item[1] = DuplicateUpload()
+            metrics.inc('upload_duplicates_skipped')
+            continue
+        seen.add(digest)
+
+        # 共用或寫入的物件在提交前都持有鎖，不會和 release_image 的刪除交錯
+        existing = claim_reusable(digest)
+        if existing is not None:
+            share_objects(row, existing)
+            if background:
+                source.close()
+            source = None
+        else:
+            _, row.object_key = new_object_key(file_storage.filename, digest)
+            lock_objects([row.object_key])
+            row.url = ''
+            row.status = STATUS_PENDING
+        staged.append((item, row, source))
+
+    if not background:
+        to_process = [(item, row, source) for item, row, source in staged if source is not None]
+        outcomes = upload_images(
+            [source for _, _, source in to_process],
+            stems=[row.content_hash for _, row, _ in to_process]
+        )
+        for (item, row, _), outcome in zip(to_process, outcomes):
+            if isinstance(outcome, Exception):
+                item[1] = outcome
+            else:
+                _, row.url, row.variants, row.phash = outcome
+                row.status = STATUS_READY
+        staged = [entry for entry in staged if entry[0][1] is None]
+
+    if not staged:
+        return 0
+    db.session.add_all([row for _, row, _ in staged])
+    try:
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.exception("Photo insert failed")
+        for item, row, source in staged:
+            item[1] = e
+            if source is None:
+                continue
+            if background:
+                source.close()
+            else:
+                try:
+                    release_image(row.object_key, row.variants)
+                except Exception:
+                    pass
+        return 0
+
+    for item, row, source in staged:
+        if source is None:
+            continue
+        if background:
+            _enqueue_upload(row.object_key, source, item[0].filename, row.content_hash)
+        else:
+            _flag_near_duplicates(row)
+    current_app.logger.info(
+        f"Saved {len(staged)} uploads ({'queued for background processing' if background else 'processed'})"
+    )
+    return len(staged)
+
+def register_direct_uploads(incoming_keys, make_row):
+    """登記瀏覽器直傳到 bucket 的檔案，以單一交易寫入「處理中」的紀錄並排入背景處理
+
+    make_row 同 save_uploads。回傳 [(incoming_key, photo_id, error)]，順序與輸入相同。
+    內容雜湊要等背景工作取回檔案後才知道，重複的照片會在那時改為共用既有物件。
+    """
+    results = [[key, None, None] for key in incoming_keys]
+    staged = []
+    for item in results:
+        try:
+            check_incoming(item[0])
+        except Exception as e:
+            item[2] = e
+            continue
+        row = make_row()
+        # 處理完成前指向 incoming 檔案，工作遺失時可以重新處理，刪除紀錄時也會一併清掉暫存檔
+        row.object_key = item[0]
+        row.url = ''
+        row.status = STATUS_PENDING
+        staged.append((item, row))
+
+    if staged:
+        db.session.add_all([row for _, row in staged])
+        try:
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.exception("Direct upload insert failed")
+            for item, _ in staged:
+                item[2] = e
+            staged = []
+
+    for item, row in staged:
+        model, photo_id = type(row), row.id
+        item[1] = photo_id
+        try:
+            _enqueue_incoming(model, photo_id, item[0])
+        except Exception as e:
+            # 未啟用工作佇列時會直接執行，失敗的紀錄已由 on_failure 標記
+            item[2] = e
+    if staged:
+        current_app.logger.info(f"Registered {len(staged)} direct uploads")
+    return [tuple(item) for item in results]
+
+def _enqueue_incoming(model, photo_id, incoming_key):
+    enqueue(_process_incoming, model, photo_id, incoming_key,
+            on_failure=_row_failure_handler(model, photo_id))
+
+def reconcile_pending(stale_after=None):
+    """處理遺失的背景工作：worker 當掉、重新部署或關閉時等不及完成的上傳會一直停在 pending
+
+    超過 stale_after 秒（預設 PENDING_TIMEOUT）仍在 pending 的紀錄中，incoming 原檔還在的直傳照片
+    重新排入處理，其餘（表單上傳的暫存緩衝區只存在記憶體中，已無法取回）標記為失敗。
+    暫時無法確認 R2 的紀錄保留到下一次。回傳 (重新排入的數量, 標記失敗的數量)。
+    """
+    if stale_after is None:
+        stale_after = current_app.config.get('PENDING_TIMEOUT', 900)
+    cutoff = datetime.utcnow() - timedelta(seconds=stale_after)
+    requeue, failed = [], 0
+    for model in MODELS:
+        rows = model.query.filter(model.status == STATUS_PENDING, model.uploaded_at < cutoff).all()
+        for row in rows:
+            if is_incoming_key(row.object_key):
+                try:
+                    check_incoming(row.object_key)
+                except ValueError:
+                    pass   # 原檔不存在或過大，無法重新處理
+                except Exception as e:
+                    current_app.logger.warning(f"Cannot check {row.object_key}, retrying later: {e}")
+                    continue
+                else:
+                    requeue.append((model, row.id, row.object_key))
+                    continue
+            row.status = STATUS_FAILED
+            failed += 1
+    db.session.commit()
+
+    for model, photo_id, incoming_key in requeue:
+        try:
+            _enqueue_incoming(model, photo_id, incoming_key)
+        except Exception:
+            # 未啟用工作佇列時直接執行，失敗的紀錄已由 on_failure 標記
+            current_app.logger.exception(f"Reprocessing {model.__name__} id={photo_id} failed")
+    if requeue or failed:
+        metrics.inc('uploads_requeued', len(requeue))
+        metrics.inc('uploads_expired', failed)
+        current_app.logger.warning(f"Reconciled stale uploads: {len(requeue)} requeued, {failed} marked failed")
+    return len(requeue), failed
+
+def start_reconciler(app):
+    """在 worker 中定期執行 reconcile_pending；未啟用工作佇列或 PENDING_RECONCILE_INTERVAL 為 0 時不執行"""
+    interval = app.config.get('PENDING_RECONCILE_INTERVAL', 300)
+    if app.config.get('JOB_QUEUE_ENABLED') and interval:
+        schedule(app, reconcile_pending, interval)
+
+def release_image_later(object_key, variants=None):
+    """紀錄刪除後釋放 R2 上的圖片（沒有其他照片共用才真的刪除）；啟用工作佇列時在背景執行並自動重試"""
+    enqueue(release_image, object_key, variants)
+
+def _retry_delete(keys):
+    """背景工作：重試刪除先前失敗的 R2 物件，仍有失敗時拋出例外讓佇列重試"""
+    failures = delete_objects(keys)
+    if failures:
+        raise RuntimeError(f"Failed deleting {len(failures)} R2 objects")
+
+def delete_rows(model, photo_ids):
+    """批次刪除照片紀錄（單一交易），再以 DeleteObjects 批次釋放沒有其他照片共用的 R2 物件
+
+    回傳 (deleted_ids, missing_ids, storage_failures)，storage_failures 為 {key: 錯誤訊息}；
+    紀錄已經刪除，失敗的 key 在啟用工作佇列時會排入背景重試。
+    """
+    photo_ids = list(dict.fromkeys(photo_ids))
+    photos = model.query.filter(model.id.in_(photo_ids)).all() if photo_ids else []
+    found = {photo.id for photo in photos}
+    missing = [photo_id for photo_id in photo_ids if photo_id not in found]
+    if not photos:
+        return [], missing, {}
+
+    images = [(photo.object_key, photo.variants) for photo in photos]
+    for photo in photos:
+        db.session.delete(photo)
+    db.session.commit()
+    deleted = [photo_id for photo_id in photo_ids if photo_id in found]
+    current_app.logger.info(f"{model.__name__} records deleted: {len(deleted)}")
+
+    try:
+        failures = release_images(images)
+    except Exception as e:
+        current_app.logger.exception("Bulk storage release failed")
+        failures = {object_key: str(e) for object_key, _ in images}
+    if failures:
+        current_app.logger.error(f"Failed deleting {len(failures)} R2 objects after bulk delete")
+        if jobs_enabled():
+            enqueue(_retry_delete, list(failures))
+    return deleted, missing, failures
@@ -0,0 +1,67 @@
+from flask import current_app
+
+# Pillow 在各函式第一次處理圖片時才匯入，worker 啟動時不需要載入
+
+# resize 先以整數倍 reduce() 粗縮到目標的這個倍數以內，再用 LANCZOS 縮到目標大小
+REDUCING_GAP = 3.0
+
+class ImageTooLarge(ValueError):
+    """像素數超過 IMAGE_MAX_PIXELS（可能是解壓縮炸彈），不做任何解碼"""
+    def __init__(self, message='圖片尺寸過大'):
+        super().__init__(message)
+
+def open_image(stream, max_pixels=None):
+    """開啟圖片並檢查像素數；此時只讀了檔頭，尚未解碼任何像素"""
+    from PIL import Image
+    if max_pixels is None:
+        max_pixels = current_app.config.get('IMAGE_MAX_PIXELS', 80_000_000)
+    try:
+        img = Image.open(stream)
+    except Image.DecompressionBombError as e:
+        raise ImageTooLarge() from e
+    if img.width * img.height > max_pixels:
+        img.close()
+        raise ImageTooLarge()
+    return img
+
+def fit_size(size, max_side):
+    """等比例縮進 max_side x max_side 方框後的尺寸，不會放大"""
+    width, height = size
+    scale = min(max_side / width, max_side / height, 1)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+def load_for_resize(img, max_side):
+    """以最大輸出尺寸解碼並套用 EXIF 方向
+
+    JPEG 透過 draft() 讓解碼器直接輸出 1/2、1/4 或 1/8 的縮圖，
+    40MP 的相片不必整張解進記憶體；縮小後的尺寸仍不會小於輸出需要的大小。
+    """
+    from PIL import ImageOps
+    if img.format == 'JPEG':
+        img.draft(img.mode, fit_size(img.size, max_side))
+    ImageOps.exif_transpose(img, in_place=True)
+    return img
+
+def resize(img, max_side):
+    """縮到 max_side 方框內，回傳新圖片；已經夠小時回傳原圖片"""
+    from PIL import Image
+    size = fit_size(img.size, max_side)
+    if size == img.size:
+        return img
+    return img.resize(size, Image.LANCZOS, reducing_gap=REDUCING_GAP)
+
+def perceptual_hash(img):
+    """計算 64 位元的 dHash（16 個十六進位字元），內容相近的圖片漢明距離也會很小"""
+    from PIL import Image
+    small = img.convert('L').resize((9, 8), Image.LANCZOS)
+    pixels = list(small.getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            bits = (bits << 1) | (left > pixels[row * 9 + col + 1])
+    return f"{bits:016x}"
+
+def hamming_distance(a, b):
+    """兩個感知雜湊的漢明距離"""
+    return bin(int(a, 16) ^ int(b, 16)).count('1')
@@ -0,0 +1,147 @@
+import atexit, os, queue, random, threading, time
+from flask import current_app
+from ..utils import metrics
+from ..utils.logging import current_request_id, request_id_var
+
+class Job:
+    def __init__(self, app, fn, args, kwargs, on_failure=None):
+        self.app = app
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.on_failure = on_failure
+        self.attempt = 1
+        # 背景執行時的日誌沿用送出工作的請求的 request id
+        self.request_id = current_request_id()
+
+    @property
+    def name(self):
+        return getattr(self.fn, '__name__', repr(self.fn))
+
+class JobQueue:
+    """行程內的背景工作佇列
+
+    每個 worker 行程第一次送出工作時才啟動 JOB_WORKERS 個執行緒（fork 之後會重新建立），
+    失敗的工作以指數退避重試 JOB_MAX_RETRIES 次（ValueError 不重試），最後仍失敗時呼叫 on_failure(exc)。
+    佇列只存在記憶體中，行程結束前最多等待 JOB_SHUTDOWN_TIMEOUT 秒把工作做完。
+    """
+    def __init__(self):
+        self._queue = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._pending = 0   # 尚未完成的工作數（含等待重試中的）
+
+    def _ensure_workers(self, app):
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            # fork 後不沿用父行程的佇列與執行緒
+            self._queue = queue.Queue()
+            self._pending = 0
+            for i in range(app.config.get('JOB_WORKERS', 2)):
+                threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True).start()
+            self._pid = pid
+            atexit.register(self.drain, app.config.get('JOB_SHUTDOWN_TIMEOUT', 30))
+
+    def submit(self, job):
+        self._ensure_workers(job.app)
+        with self._lock:
+            self._pending += 1
+        metrics.inc('jobs_enqueued')
+        self._queue.put(job)
+
+    def pending(self):
+        return self._pending
+
+    def drain(self, timeout):
+        """等待佇列中的工作完成，最多 timeout 秒；回傳是否全部完成"""
+        deadline = time.monotonic() + timeout
+        while self.pending() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return not self.pending()
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if not self._run(job):
+                with self._lock:
+                    self._pending -= 1
+
+    def _run(self, job):
+        """執行工作；排定重試時回傳 True（工作尚未完成）"""
+        token = request_id_var.set(job.request_id)
+        try:
+            return self._run_in_context(job)
+        finally:
+            request_id_var.reset(token)
+
+    def _run_in_context(self, job):
+        app = job.app
+        with app.app_context():
+            try:
+                job.fn(*job.args, **job.kwargs)
+                metrics.inc('jobs_succeeded')
+                return False
+            except Exception as e:
+                error = e
+            # ValueError 代表輸入本身有問題（例如圖片過大），重試也不會成功
+            if not isinstance(error, ValueError) and job.attempt <= app.config.get('JOB_MAX_RETRIES', 3):
+                delay = app.config.get('JOB_RETRY_BACKOFF', 2) ** job.attempt
+                app.logger.warning(f"Job {job.name} failed (attempt {job.attempt}), retrying in {delay}s: {error}")
+                metrics.inc('jobs_retried')
+                job.attempt += 1
+                timer = threading.Timer(delay, self._queue.put, args=(job,))
+                timer.daemon = True
+                timer.start()
+                return True
+            app.logger.error(f"Job {job.name} failed after {job.attempt} attempts", exc_info=error)
+            metrics.inc('jobs_failed')
+            if job.on_failure is not None:
+                try:
+                    job.on_failure(error)
+                except Exception:
+                    app.logger.exception(f"on_failure handler for job {job.name} failed")
+            return False
+
+_job_queue = JobQueue()
+
+def jobs_enabled():
+    return current_app.config.get('JOB_QUEUE_ENABLED', False)
+
+def enqueue(fn, *args, on_failure=None, **kwargs):
+    """送出背景工作；JOB_QUEUE_ENABLED 關閉時直接在目前請求中執行（不重試）"""
+    if not jobs_enabled():
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if on_failure is not None:
+                on_failure(e)
+            raise
+    _job_queue.submit(Job(current_app._get_current_object(), fn, args, kwargs, on_failure))
+
+def schedule(app, fn, interval, *args, **kwargs):
+    """每 interval 秒把 fn 送進目前行程的工作佇列
+
+    第一次在 0 到 interval 秒之間隨機的時間執行，避免所有 worker 同時啟動時一起執行。
+    """
+    def _tick():
+        _job_queue.submit(Job(app, fn, args, kwargs))
+        _start(interval)
+
+    def _start(delay):
+        timer = threading.Timer(delay, _tick)
+        timer.daemon = True
+        timer.start()
+
+    _start(random.uniform(0, interval))
+
+def pending_jobs():
+    """目前行程尚未完成（含等待重試）的工作數"""
+    return _job_queue.pending()
+
+def wait_for_jobs(timeout=30):
+    """等待目前行程的背景工作完成，主要給 CLI 與效能測試使用"""
+    return _job_queue.drain(timeout)
@@ -1,34 +1,96 @@
-from .storage import upload_image, delete_image, allowed_file
+from .storage import allowed_file
+from .image_jobs import save_uploads, register_direct_uploads, release_image_later, delete_rows
 from ..extensions import db
 from ..models import Photo
+from ..utils.pagination import encode_cursor, decode_cursor
+from ..utils.cache import app_cache
+from ..utils.database import read_session
 from flask import current_app
+from sqlalchemy import tuple_, func
+from datetime import datetime
 
-def save_photo(file_storage):
-    filename = file_storage.filename
-    if not allowed_file(filename):
-        current_app.logger.warning(f"Unsupported format: {filename}")
-        raise ValueError("不支援的檔案格式")
-    current_app.logger.debug(f"Saving photo: {filename}")
-    object_key, url = upload_image(file_storage)
-    photo = Photo(object_key=object_key, url=url)
-    db.session.add(photo)
-    db.session.commit()
-    current_app.logger.info(f"Photo record created: id={photo.id}")
-    return photo
+def save_photos(file_storages):
+    """批次保存照片：並行縮圖與上傳，再以單一交易寫入所有紀錄
+
+    回傳 [(file_storage, error)]，順序與輸入相同；error 為 None 代表成功，
+    不支援的格式或重複的照片為 ValueError，其餘失敗則是原本的例外。
+    啟用 JOB_QUEUE_ENABLED 時只寫入 pending 紀錄，縮圖與上傳交給背景工作。
+    """
+    results = [[fs, None] for fs in file_storages]
+    pending = []
+    for item in results:
+        filename = item[0].filename
+        if not allowed_file(filename):
+            current_app.logger.warning(f"Unsupported format: {filename}")
+            item[1] = ValueError("不支援的檔案格式")
+        else:
+            current_app.logger.debug(f"Saving photo: {filename}")
+            pending.append(item)
+
+    if save_uploads(pending, Photo):
+        invalidate_photo_count()
+    return [tuple(item) for item in results]
+
+def register_uploaded_photos(incoming_keys):
+    """登記瀏覽器直傳完成的檔案，回傳 [(incoming_key, photo_id, error)]"""
+    results = register_direct_uploads(incoming_keys, Photo)
+    if any(photo_id for _, photo_id, _ in results):
+        invalidate_photo_count()
+    return results
+
+def _count_cache():
+    return app_cache('photo_count', maxsize=1)
+
+def invalidate_photo_count():
+    """照片新增或刪除後清除數量快取"""
+    _count_cache().clear()
+
+def count_photos():
+    """照片總數；以 COUNT(*) 查詢並快取，本行程寫入時立即失效"""
+    return _count_cache().get_or_set(
+        'count',
+        lambda: read_session().query(func.count(Photo.id)).scalar(),
+        ttl=current_app.config.get('STATS_CACHE_TTL', 60)
+    )
 
 def list_photos():
-    return Photo.query.order_by(Photo.uploaded_at).all()
+    return read_session().query(Photo).order_by(Photo.uploaded_at).all()
+
+def list_photos_page(limit, cursor=None):
+    """依 (uploaded_at, id) 做 keyset 分頁，回傳 (photos, next_cursor)
+
+    cursor 為上一頁回傳的游標，最後一頁的 next_cursor 為 None。
+    """
+    query = read_session().query(Photo).order_by(Photo.uploaded_at, Photo.id)
+    if cursor:
+        uploaded_at, photo_id = decode_cursor(cursor, datetime, int)
+        query = query.filter(tuple_(Photo.uploaded_at, Photo.id) > tuple_(uploaded_at, photo_id))
+    photos = query.limit(limit + 1).all()
+    if len(photos) <= limit:
+        return photos, None
+    last = photos[limit - 1]
+    return photos[:limit], encode_cursor(last.uploaded_at, last.id)
 
 def delete_photo(photo_id):
     photo = Photo.query.get(photo_id)
     if not photo:
         current_app.logger.warning(f"Photo id {photo_id} not found")
         return False
+    object_key, variants = photo.object_key, photo.variants
+    db.session.delete(photo)
+    db.session.commit()
+    invalidate_photo_count()
+    # 紀錄刪除後才釋放 R2 物件，其他照片仍共用時會保留
     try:
-        delete_image(photo.object_key)
+        release_image_later(object_key, variants)
     except Exception:
         current_app.logger.error(f"Error deleting image from storage for id={photo_id}")
-    db.session.delete(photo)
-    db.session.commit()
     current_app.logger.info(f"Photo record deleted: id={photo_id}")
     return True
+
+def delete_photos(photo_ids):
+    """批次刪除照片，回傳 (deleted_ids, missing_ids, storage_failures)，見 delete_rows"""
+    deleted, missing, failures = delete_rows(Photo, photo_ids)
+    if deleted:
+        invalidate_photo_count()
+    return deleted, missing, failures
@@ -1,68 +1,423 @@
-import os, uuid
-from PIL import Image
-import boto3
-from botocore.config import Config as BotoConfig
+import io, os, uuid, hashlib, threading, tempfile
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
 from flask import current_app
+from .imaging import ImageTooLarge, open_image, load_for_resize, resize, perceptual_hash
+from ..utils import metrics
+from ..utils.cache import app_cache
+from ..utils.timing import timed
 
 ALLOWED_EXTENSIONS = {'png','jpg','jpeg','gif'}
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.',1)[1].lower() in ALLOWED_EXTENSIONS
 
-def get_r2_client():
-    cfg = BotoConfig(signature_version='s3v4')
+# 每個 worker 行程共用一個 boto3 client（client 本身是 thread-safe）
+_client_lock = threading.Lock()
+_clients = {}
+
+def _client_settings(config):
+    return (
+        config['R2_ENDPOINT_URL'],
+        config['R2_ACCESS_KEY_ID'],
+        config['R2_SECRET_ACCESS_KEY'],
+        config.get('R2_MAX_POOL_CONNECTIONS', 20),
+        config.get('R2_CONNECT_TIMEOUT', 5),
+        config.get('R2_READ_TIMEOUT', 60),
+        config.get('R2_MAX_ATTEMPTS', 3),
+        config.get('R2_TCP_KEEPALIVE', True),
+    )
+
+def _build_r2_client(settings):
+    # boto3 載入就要數百毫秒與數十 MB，等第一次需要 client 時才匯入
+    import boto3
+    from botocore.config import Config as BotoConfig
+    endpoint, key_id, secret, pool_size, connect_timeout, read_timeout, attempts, keepalive = settings
+    cfg = BotoConfig(
+        signature_version='s3v4',
+        max_pool_connections=pool_size,
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout,
+        retries={'max_attempts': attempts, 'mode': 'standard'},
+        tcp_keepalive=keepalive,
+    )
     return boto3.client(
         's3',
-        endpoint_url=current_app.config['R2_ENDPOINT_URL'],
-        aws_access_key_id=current_app.config['R2_ACCESS_KEY_ID'],
-        aws_secret_access_key=current_app.config['R2_SECRET_ACCESS_KEY'],
+        endpoint_url=endpoint,
+        aws_access_key_id=key_id,
+        aws_secret_access_key=secret,
         config=cfg
     )
 
-def upload_image(file_storage):
-    filename = file_storage.filename
-    ext = filename.rsplit('.',1)[1].lower()
-    object_key = f"{uuid.uuid4().hex}.{ext}"
+def get_r2_client():
+    """取得共用的 R2 client；fork 後的子行程會重新建立自己的連線池"""
+    settings = _client_settings(current_app.config)
+    cache_key = (os.getpid(), settings)
+    client = _clients.get(cache_key)
+    if client is not None:
+        metrics.inc('r2_client_pool_hits')
+        return client
+    with _client_lock:
+        client = _clients.get(cache_key)
+        if client is None:
+            metrics.inc('r2_client_pool_misses')
+            client = _build_r2_client(settings)
+            # 只保留目前行程的 client，避免 fork 後殘留父行程的連線
+            for key in [k for k in _clients if k[0] != cache_key[0]]:
+                del _clients[key]
+            _clients[cache_key] = client
+        else:
+            metrics.inc('r2_client_pool_hits')
+    return client
 
-    file_storage.stream.seek(0)
-    try:
-        img = Image.open(file_storage.stream)
-        img.thumbnail((1024,1024), Image.ANTIALIAS)
-        tmp_path = os.path.join('/tmp', object_key)
-        img.save(tmp_path, optimize=True, quality=85)
-        upload_path = tmp_path; use_stream=False
-    except Exception:
-        file_storage.stream.seek(0)
-        upload_path = file_storage.stream; use_stream=True
+def preload_modules():
+    """預先載入 boto3 的 S3 服務定義與 Pillow 的格式外掛
 
-    client = get_r2_client()
-    bucket = current_app.config['R2_BUCKET_NAME']
-    if use_stream:
-        client.upload_fileobj(upload_path, bucket, object_key)
-    else:
-        client.upload_file(upload_path, bucket, object_key)
-        try: os.remove(upload_path)
-        except: pass
+    gunicorn --preload 時在 master 中呼叫，fork 出來的 worker 以 copy-on-write 共用這些記憶體，
+    不必各自再花數百毫秒載入；建立的 client 不連線，也不會被 worker 使用。
+    """
+    import boto3
+    from PIL import Image
+    Image.init()
+    boto3.client('s3', region_name='us-east-1', aws_access_key_id='preload', aws_secret_access_key='preload')
+
+def init_storage(app):
+    """預先建立目前行程的 R2 client，讓第一個請求就能使用暖好的連線（gunicorn post_fork 時呼叫）"""
+    if not app.config.get('R2_ENDPOINT_URL'):
+        app.logger.debug("R2 endpoint not configured; skip client warm-up")
+        return
+    with app.app_context():
+        get_r2_client()
+
+class SpooledBuffer(tempfile.SpooledTemporaryFile):
+    """未超過上限前不提供 fileno() 的 SpooledTemporaryFile
+
+    Pillow 存檔時會先嘗試 fileno()，原生的 SpooledTemporaryFile 會因此立刻寫入磁碟。
+    """
+    @property
+    def rolled(self):
+        return self._rolled
+
+    def fileno(self):
+        if not self._rolled:
+            raise io.UnsupportedOperation("buffer is still in memory")
+        return super().fileno()
 
-    # presigned URL（7 天到期，可依需求調整）
+def _presign(client, bucket, object_key, expires):
     try:
-        presigned_url = client.generate_presigned_url(
+        return client.generate_presigned_url(
             'get_object',
             Params={'Bucket':bucket,'Key':object_key},
-            ExpiresIn=7*24*3600
+            ExpiresIn=expires
         )
     except Exception:
-        presigned_url = f"{current_app.config['R2_ENDPOINT_URL']}/{bucket}/{object_key}"
+        return f"{current_app.config['R2_ENDPOINT_URL']}/{bucket}/{object_key}"
 
-    current_app.logger.debug(f"Uploaded to R2: {object_key}")
-    return object_key, presigned_url
+def resolve_url(object_key):
+    """依 object_key 取得可顯示的圖片網址
+
+    設定 R2_PUBLIC_BASE_URL（公開 bucket 或 CDN）時直接組出網址；否則在第一次使用時
+    產生 presigned URL 並快取，快取會在網址到期前 R2_PRESIGN_REFRESH_MARGIN 秒失效，
+    因此頁面上的網址至少還有這段時間可用。
+    """
+    config = current_app.config
+    public_base = config.get('R2_PUBLIC_BASE_URL')
+    if public_base:
+        return f"{public_base.rstrip('/')}/{quote(object_key)}"
+
+    expires = config.get('R2_PRESIGN_EXPIRES', 7*24*3600)
+    ttl = max(expires - config.get('R2_PRESIGN_REFRESH_MARGIN', 24*3600), 0)
+    cache = app_cache('presigned_url', maxsize=config.get('R2_URL_CACHE_SIZE', 10000))
+    return cache.get_or_set(
+        object_key,
+        lambda: _presign(get_r2_client(), config['R2_BUCKET_NAME'], object_key, expires),
+        ttl=ttl
+    )
+
+# 各格式的編碼參數，沒有列出的格式使用 DEFAULT_ENCODE_OPTIONS
+DEFAULT_ENCODE_OPTIONS = {'optimize': True, 'quality': 85}
+ENCODE_OPTIONS = {
+    'WEBP': {'quality': 80, 'method': 4},
+    'AVIF': {'quality': 60, 'speed': 6},
+}
+
+CONTENT_TYPES = {
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+    'GIF': 'image/gif',
+    'WEBP': 'image/webp',
+    'AVIF': 'image/avif',
+}
+
+def modern_formats():
+    """目前 Pillow 支援、且設定要額外產生的新格式（例如 WEBP / AVIF）"""
+    from PIL import features
+    wanted = current_app.config.get('IMAGE_MODERN_FORMATS', ())
+    return [fmt for fmt in wanted if features.check(fmt.lower())]
+
+def _encode(img, fmt):
+    """把 Pillow 圖片編碼進緩衝區，超過 UPLOAD_SPOOL_MAX_SIZE 才落地成暫存檔"""
+    buffer = SpooledBuffer(max_size=current_app.config.get('UPLOAD_SPOOL_MAX_SIZE', 8*1024*1024))
+    try:
+        img.save(buffer, format=fmt, **ENCODE_OPTIONS.get(fmt, DEFAULT_ENCODE_OPTIONS))
+    except Exception:
+        buffer.close()
+        raise
+    metrics.inc('upload_spool_rolled_to_disk' if buffer.rolled else 'upload_spool_in_memory')
+    metrics.inc('upload_encoded_bytes', buffer.tell())
+    return buffer
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+def new_object_key(filename, digest=None):
+    """為上傳檔案產生 (stem, object_key)；給定內容雜湊時 key 由內容決定，相同檔案會得到相同 key"""
+    ext = filename.rsplit('.',1)[1].lower()
+    stem = digest or uuid.uuid4().hex
+    return stem, f"{stem}.{ext}"
+
+def content_digest(stream):
+    """分塊計算串流內容的 sha256，完成後回到開頭"""
+    digest = hashlib.sha256()
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(COPY_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+def buffer_upload(file_storage):
+    """把上傳檔案複製到 SpooledBuffer，讓請求結束後仍能在背景處理
+
+    複製時順便計算 sha256，結果放在 buffer.content_hash。
+    """
+    buffer = SpooledBuffer(max_size=current_app.config.get('UPLOAD_SPOOL_MAX_SIZE', 8*1024*1024))
+    digest = hashlib.sha256()
+    file_storage.stream.seek(0)
+    for chunk in iter(lambda: file_storage.stream.read(COPY_CHUNK_SIZE), b''):
+        digest.update(chunk)
+        buffer.write(chunk)
+    buffer.seek(0)
+    buffer.content_hash = digest.hexdigest()
+    return buffer
 
-def delete_image(object_key):
+INCOMING_PREFIX = 'incoming/'
+
+def presign_upload(filename):
+    """產生讓瀏覽器直接把檔案 PUT 到 bucket 的 presigned URL
+
+    檔案先放在 incoming/ 底下，完成後再由 fetch_incoming 取回處理。
+    R2 不支援 presigned POST，因此使用 PUT；大小限制改在完成回報時以 head_object 檢查。
+    """
+    if not allowed_file(filename):
+        raise ValueError('不支援的檔案格式')
+    ext = filename.rsplit('.',1)[1].lower()
+    key = f"{INCOMING_PREFIX}{uuid.uuid4().hex}.{ext}"
+    from PIL import Image
+    content_type = CONTENT_TYPES[Image.registered_extensions()[f'.{ext}']]
+    url = get_r2_client().generate_presigned_url(
+        'put_object',
+        Params={'Bucket': current_app.config['R2_BUCKET_NAME'], 'Key': key, 'ContentType': content_type},
+        ExpiresIn=current_app.config.get('DIRECT_UPLOAD_EXPIRES', 600)
+    )
+    return {'key': key, 'url': url, 'method': 'PUT', 'headers': {'Content-Type': content_type}}
+
+def presign_uploads(filenames):
+    """批次產生直傳網址，不支援的檔名會在結果中帶 error"""
+    results = []
+    for filename in filenames[:current_app.config.get('DIRECT_UPLOAD_MAX_FILES', 50)]:
+        try:
+            results.append({'filename': filename, **presign_upload(filename)})
+        except ValueError as e:
+            results.append({'filename': filename, 'error': str(e)})
+    return results
+
+def is_incoming_key(key):
+    """檢查 key 是否為 presign_upload 發出的格式，避免完成回報引用 bucket 內其他檔案"""
+    if not isinstance(key, str) or not key.startswith(INCOMING_PREFIX):
+        return False
+    name = key[len(INCOMING_PREFIX):]
+    stem, _, ext = name.partition('.')
+    return len(stem) == 32 and all(c in '0123456789abcdef' for c in stem) and allowed_file(name)
+
+def check_incoming(key):
+    """確認瀏覽器已上傳 incoming 檔案且大小合法，回傳位元組數"""
+    if not is_incoming_key(key):
+        raise ValueError('無效的上傳代碼')
     client = get_r2_client()
     bucket = current_app.config['R2_BUCKET_NAME']
     try:
-        client.delete_object(Bucket=bucket, Key=object_key)
-        current_app.logger.debug(f"Deleted from R2: {object_key}")
-    except Exception as e:
-        current_app.logger.error(f"Failed deleting R2 object {object_key}: {e}")
+        head = client.head_object(Bucket=bucket, Key=key)
+    except client.exceptions.ClientError:
+        raise ValueError('找不到已上傳的檔案')
+    size = head['ContentLength']
+    if size > current_app.config.get('DIRECT_UPLOAD_MAX_SIZE', 20*1024*1024):
+        client.delete_object(Bucket=bucket, Key=key)
+        raise ValueError('檔案太大')
+    return size
+
+def fetch_incoming(key):
+    """把 incoming 檔案下載到 SpooledBuffer 供縮圖使用"""
+    buffer = SpooledBuffer(max_size=current_app.config.get('UPLOAD_SPOOL_MAX_SIZE', 8*1024*1024))
+    try:
+        get_r2_client().download_fileobj(current_app.config['R2_BUCKET_NAME'], key, buffer)
+    except Exception:
+        buffer.close()
         raise
+    buffer.seek(0)
+    return buffer
+
+@timed('upload')
+def upload_image(file_storage, stem=None):
+    """縮圖並上傳圖片及各尺寸衍生圖，回傳值見 process_image"""
+    return process_image(file_storage.stream, file_storage.filename, stem=stem)
+
+def process_image(stream, filename, stem=None):
+    """縮圖並上傳圖片及各尺寸衍生圖
+
+    回傳 (object_key, url, variants, phash)。object_key 是最大尺寸的版本，
+    variants 依寬度由大到小列出每個尺寸、每種格式的 key / 寬度 / 格式 / 位元組數，
+    第一筆一定是主圖；無法解碼的檔案會原樣上傳，variants 為空列表、phash 為 None；
+    像素數超過 IMAGE_MAX_PIXELS 時拋出 ImageTooLarge，不會上傳任何東西。
+    stem 可指定 object_key 的主檔名（通常是內容雜湊，或背景處理時先寫入資料庫的 key）。
+    """
+    from PIL import Image
+    ext = filename.rsplit('.',1)[1].lower()
+    if stem is None:
+        stem, object_key = new_object_key(filename)
+    else:
+        object_key = f"{stem}.{ext}"
+
+    client = get_r2_client()
+    bucket = current_app.config['R2_BUCKET_NAME']
+    widths = sorted(set(current_app.config.get('IMAGE_VARIANT_WIDTHS', (1024,))), reverse=True)
+    extra_formats = modern_formats()
+
+    with ExitStack() as stack:
+        encoded = []
+        phash = None
+        stream.seek(0)
+        try:
+            img = open_image(stream)
+            fmt = Image.registered_extensions()[f'.{ext}']
+            img = load_for_resize(img, widths[0])
+            # 由大到小依序縮圖，小尺寸直接從上一個結果縮，不必重新解碼原圖
+            for width in widths:
+                img = resize(img, width)
+                if encoded and encoded[-1][1] == img.width:
+                    continue  # 原圖比這個尺寸還小
+                suffix = '' if not encoded else f"_{width}"
+                encoded.append((f"{stem}{suffix}.{ext}", img.width, fmt, stack.enter_context(_encode(img, fmt))))
+                for extra in extra_formats:
+                    try:
+                        buffer = stack.enter_context(_encode(img, extra))
+                    except Exception:
+                        current_app.logger.debug(f"Cannot encode {filename} as {extra}")
+                        continue
+                    encoded.append((f"{stem}{suffix}.{extra.lower()}", img.width, extra, buffer))
+            phash = perceptual_hash(img)
+        except ImageTooLarge:
+            current_app.logger.warning(f"Rejecting {filename}: too many pixels")
+            raise
+        except Exception:
+            current_app.logger.debug(f"Cannot resize {filename}, uploading original bytes")
+            stack.close()
+            encoded = []
+            phash = None
+
+        variants = []
+        if not encoded:
+            stream.seek(0)
+            client.upload_fileobj(stream, bucket, object_key)
+        for key, width, key_fmt, buffer in encoded:
+            size = buffer.tell()
+            buffer.seek(0)
+            client.upload_fileobj(buffer, bucket, key, ExtraArgs={'ContentType': CONTENT_TYPES[key_fmt]})
+            variants.append({
+                'key': key,
+                'width': width,
+                'format': key_fmt.lower(),
+                'bytes': size,
+            })
+
+    current_app.logger.debug(f"Uploaded to R2: {object_key} ({len(variants)} variants)")
+    return object_key, resolve_url(object_key), variants, phash
+
+def format_savings(variants):
+    """統計每種格式的總位元組數，以及相對原始格式省下的位元組數
+
+    回傳 {format: {'bytes': n, 'saved': m}}；沒有衍生圖時回傳空 dict。
+    """
+    if not variants:
+        return {}
+    totals = {}
+    for v in variants:
+        totals[v['format']] = totals.get(v['format'], 0) + v['bytes']
+    base = totals[variants[0]['format']]
+    return {fmt: {'bytes': n, 'saved': base - n} for fmt, n in totals.items()}
+
+@timed('upload')
+def upload_images(file_storages, stems=None):
+    """並行處理並上傳多張圖片
+
+    Pillow 縮圖與 R2 上傳都在有上限的執行緒池中進行，回傳的列表順序與輸入相同，
+    每個元素是 upload_image 的回傳值，失敗時則是對應的例外物件。
+    stems 可逐一指定 object_key 的主檔名（例如內容雜湊）。
+    """
+    if not file_storages:
+        return []
+    app = current_app._get_current_object()
+    stems = stems or [None] * len(file_storages)
+
+    def _upload(file_storage, stem):
+        with app.app_context():
+            try:
+                return upload_image(file_storage, stem=stem)
+            except Exception as e:
+                return e
+
+    workers = min(app.config.get('UPLOAD_WORKERS', 4), len(file_storages))
+    if workers <= 1:
+        return [_upload(fs, stem) for fs, stem in zip(file_storages, stems)]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='upload') as pool:
+        return list(pool.map(_upload, file_storages, stems))
+
+# DeleteObjects 每次最多 1000 個 key
+DELETE_BATCH_SIZE = 1000
+
+def image_keys(object_key, variants=None):
+    """一張圖片在 R2 上的所有 key（主圖加上各尺寸衍生圖）"""
+    return [object_key] + [v['key'] for v in variants or [] if v['key'] != object_key]
+
+@timed('r2_delete')
+def delete_objects(keys):
+    """以 DeleteObjects 每批最多 DELETE_BATCH_SIZE 個 key 刪除，回傳 {key: 錯誤訊息}，全部成功時為空 dict"""
+    client = get_r2_client()
+    bucket = current_app.config['R2_BUCKET_NAME']
+    keys = list(dict.fromkeys(keys))
+    failures = {}
+    for start in range(0, len(keys), DELETE_BATCH_SIZE):
+        batch = keys[start:start + DELETE_BATCH_SIZE]
+        try:
+            response = client.delete_objects(
+                Bucket=bucket,
+                Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True}
+            )
+        except Exception as e:
+            current_app.logger.error(f"Failed deleting {len(batch)} R2 objects: {e}")
+            failures.update({key: str(e) for key in batch})
+            continue
+        errors = response.get('Errors', [])
+        for error in errors:
+            failures[error['Key']] = error.get('Message') or error.get('Code', 'Unknown error')
+        metrics.inc('storage_delete_batches')
+        metrics.inc('storage_objects_deleted', len(batch) - len(errors))
+        current_app.logger.debug(f"Deleted {len(batch) - len(errors)} objects from R2")
+    return failures
+
+@timed('r2_delete')
+def delete_image(object_key, variants=None):
+    """刪除圖片以及它的所有衍生尺寸（一次 DeleteObjects 請求），任何一個失敗就拋出例外"""
+    failures = delete_objects(image_keys(object_key, variants))
+    if failures:
+        current_app.logger.error(f"Failed deleting R2 objects: {failures}")
+        raise RuntimeError(f"Failed deleting {len(failures)} R2 objects for {object_key}")
@@ -0,0 +1,144 @@
+import gzip, hashlib, json, os, re
+from flask import current_app, url_for, send_from_directory, request, abort
+
+# 每個頁面的打包清單：輸出名稱 -> static 下的原始檔（依載入順序）
+BUNDLES = {
+    'home.js': ['js/home.js'],
+    'home.css': ['css/home.css'],
+    'memory.js': ['js/letter.js', 'js/direct-upload.js', 'js/bulk-select.js', 'js/script.js', 'js/star-background.js'],
+    'memory.css': ['css/gallery.css', 'css/style.css'],
+    'birthday.js': ['js/direct-upload.js', 'js/bulk-select.js', 'js/birthday.js'],
+    'birthday.css': ['css/gallery.css', 'css/birthday.css'],
+}
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+# 檔名含內容雜湊，內容改變就是新網址，可以永久快取
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+def _minify_css(source):
+    try:
+        import rcssmin
+        return rcssmin.cssmin(source)
+    except ImportError:
+        pass
+    # 沒有 rcssmin 時只做安全的處理：移除註解、縮排與空行
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    return '\n'.join(line.strip() for line in source.splitlines() if line.strip()) + '\n'
+
+def _minify_js(source):
+    try:
+        import rjsmin
+        return rjsmin.jsmin(source)
+    except ImportError:
+        # 正規表達式與多行樣板字串讓手寫的 JS 壓縮不安全，沒有 rjsmin 時保留原文，靠 gzip / brotli 壓縮
+        return source
+
+def _bundle(static_folder, files, ext):
+    parts = []
+    for name in files:
+        with open(os.path.join(static_folder, name), encoding='utf-8') as f:
+            parts.append(f.read())
+    if ext == 'js':
+        # 各檔案原本是獨立的 <script>，以分號隔開避免串接後的語法連在一起
+        return '\n;\n'.join(_minify_js(part) for part in parts)
+    return '\n'.join(_minify_css(part) for part in parts)
+
+def _write_compressed(path, data):
+    """寫入 .gz，以及安裝 brotli 套件時的 .br"""
+    sizes = {}
+    with open(path + '.gz', 'wb') as f:
+        compressed = gzip.compress(data, compresslevel=9, mtime=0)
+        f.write(compressed)
+    sizes['gzip'] = len(compressed)
+    try:
+        import brotli
+    except ImportError:
+        return sizes
+    compressed = brotli.compress(data, quality=11)
+    with open(path + '.br', 'wb') as f:
+        f.write(compressed)
+    sizes['br'] = len(compressed)
+    return sizes
+
+def build_assets(static_folder, bundles=None):
+    """打包、壓縮並以內容雜湊命名，寫入 static/dist 與 manifest.json；回傳 {名稱: 大小資訊}"""
+    bundles = bundles or BUNDLES
+    dist = os.path.join(static_folder, DIST_DIR)
+    os.makedirs(dist, exist_ok=True)
+    manifest = {}
+    report = {}
+    for name, files in bundles.items():
+        stem, ext = name.rsplit('.', 1)
+        data = _bundle(static_folder, files, ext).encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        filename = f"{stem}.{digest}.{ext}"
+        path = os.path.join(dist, filename)
+        with open(path, 'wb') as f:
+            f.write(data)
+        sizes = _write_compressed(path, data)
+        manifest[name] = filename
+        report[name] = {
+            'file': filename,
+            'source': sum(os.path.getsize(os.path.join(static_folder, file)) for file in files),
+            'bytes': len(data),
+            **sizes,
+        }
+
+    # 刪除上一次建置留下、已不在 manifest 中的檔案
+    current = set(manifest.values())
+    for entry in os.listdir(dist):
+        base = entry[:-3] if entry.endswith(('.gz', '.br')) else entry
+        if entry != MANIFEST_NAME and base not in current:
+            os.remove(os.path.join(dist, entry))
+
+    with open(os.path.join(dist, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return report
+
+def load_manifest(app):
+    """讀取 static/dist/manifest.json；尚未建置時回傳 None，頁面改用原始檔"""
+    path = os.path.join(app.static_folder, DIST_DIR, MANIFEST_NAME)
+    if not app.config.get('ASSETS_ENABLED', True) or not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def asset_urls(name):
+    """模板用：打包後的單一網址，未建置時是原始檔的網址列表
+
+        {% for src in asset_urls('memory.js') %}<script src="{{ src }}"></script>{% endfor %}
+    """
+    manifest = current_app.extensions.get('assets.manifest')
+    if manifest and name in manifest:
+        return [url_for('assets', filename=manifest[name])]
+    return [url_for('static', filename=file) for file in BUNDLES[name]]
+
+# 依偏好順序：(Accept-Encoding 名稱, 副檔名)
+_ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+def serve_asset(filename):
+    """送出建置好的檔案，依 Accept-Encoding 選用預先壓縮的版本"""
+    dist = os.path.join(current_app.static_folder, DIST_DIR)
+    if filename == MANIFEST_NAME or filename.endswith(('.gz', '.br')):
+        abort(404)
+    mimetype = 'text/css' if filename.endswith('.css') else 'application/javascript'
+    encoding = None
+    for name, suffix in _ENCODINGS:
+        if name in request.accept_encodings and os.path.exists(os.path.join(dist, filename + suffix)):
+            encoding = name
+            filename += suffix
+            break
+    response = send_from_directory(dist, filename, mimetype=mimetype, conditional=True, etag=True)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+def init_assets(app):
+    """載入 manifest 並註冊 /assets/<filename> 路由與 asset_urls 模板函式"""
+    app.extensions['assets.manifest'] = load_manifest(app)
+    app.add_url_rule('/assets/<path:filename>', endpoint='assets', view_func=serve_asset)
+    app.add_template_global(asset_urls)
@@ -0,0 +1,101 @@
+import threading, time
+from collections import OrderedDict
+from flask import current_app
+from . import metrics
+
+_MISSING = object()
+
+class TTLCache:
+    """執行緒安全的行程內 LRU 快取，每筆資料可設定存活秒數
+
+    命中與未命中會記錄在 metrics 的 cache_<name>_hits / cache_<name>_misses；name 為 None 時不記錄。
+    """
+    def __init__(self, name, maxsize=1024, ttl=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = {}   # key -> 正在計算這個 key 的執行緒持有的 Lock
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is not _MISSING:
+                value, expires_at = item
+                if expires_at is None or expires_at > now:
+                    self._data.move_to_end(key)
+                    if self.name:
+                        metrics.inc(f'cache_{self.name}_hits')
+                    return value
+                del self._data[key]
+        if self.name:
+            metrics.inc(f'cache_{self.name}_misses')
+        return default
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_set(self, key, factory, ttl=None):
+        """取得快取值，不存在時呼叫 factory() 計算並寫入
+
+        多個執行緒同時未命中同一個 key 時只有一個會呼叫 factory()，其餘等它算完直接取用結果。
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        with self._lock:
+            loading = self._loading.setdefault(key, threading.Lock())
+        with loading:
+            # 等待期間其他執行緒可能已經算好
+            value = self._peek(key)
+            if value is _MISSING:
+                try:
+                    value = factory()
+                    self.set(key, value, ttl)
+                finally:
+                    with self._lock:
+                        self._loading.pop(key, None)
+        return value
+
+    def _peek(self, key):
+        # 不更新命中統計的 get
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return _MISSING
+            value, expires_at = item
+            return value if expires_at is None or expires_at > time.monotonic() else _MISSING
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+_app_cache_lock = threading.Lock()
+
+def app_cache(name, maxsize=1024, ttl=None):
+    """取得目前 app 專屬的具名快取，第一次使用時建立"""
+    extensions = current_app.extensions
+    key = f'cache.{name}'
+    cache = extensions.get(key)
+    if cache is None:
+        with _app_cache_lock:
+            cache = extensions.get(key)
+            if cache is None:
+                cache = extensions[key] = TTLCache(name, maxsize=maxsize, ttl=ttl)
+    return cache
@@ -0,0 +1,102 @@
+import threading, time
+from flask import current_app, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.pool import QueuePool
+from ..extensions import db
+from . import metrics
+
+REPLICA_BIND = 'replica'
+
+class TimedQueuePool(QueuePool):
+    """會記錄取得連線等待時間的 QueuePool
+
+    db_pool_wait_seconds 包含在池中排隊與建立新連線的時間；等到 pool_timeout 仍拿不到連線時
+    累加 db_pool_timeouts。標籤 pool 為 bind 名稱（pool_logging_name）。
+    """
+    def _do_get(self):
+        name = self._orig_logging_name or 'default'
+        start = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except PoolTimeout:
+            metrics.inc('db_pool_timeouts')
+            raise
+        finally:
+            metrics.observe('db_pool_wait_seconds', time.perf_counter() - start, pool=name)
+        record.info['checked_out_at'] = time.perf_counter()
+        record.info['pool_name'] = name
+        return record
+
+def _on_checkin(dbapi_connection, connection_record):
+    started = connection_record.info.pop('checked_out_at', None)
+    if started is not None:
+        # 連線被借出的時間：過長代表交易或請求佔住連線太久
+        metrics.observe('db_pool_checkout_seconds', time.perf_counter() - started,
+                        pool=connection_record.info.get('pool_name', 'default'))
+
+event.listen(TimedQueuePool, 'checkin', _on_checkin)
+
+def _request_statement_timeout(conn):
+    # 只限制請求中的交易：SET LOCAL 在交易結束時失效，連線回到池中後不會影響 migration 或背景工作
+    if conn.dialect.name != 'postgresql' or not has_request_context():
+        return
+    timeout = current_app.config.get('DB_STATEMENT_TIMEOUT_MS')
+    if timeout:
+        conn.exec_driver_sql(f'SET LOCAL statement_timeout = {int(timeout)}')
+
+def _use_timed_pool(options, name):
+    # SQLite 等沒有設定連線池參數的資料庫維持 SQLAlchemy 預設
+    if 'pool_size' in options:
+        options.setdefault('poolclass', TimedQueuePool)
+        options.setdefault('pool_logging_name', name)
+
+def init_database(app):
+    """在 db.init_app 之前呼叫：替主資料庫與唯讀副本套用有量測的連線池，並限制請求中查詢的時間"""
+    if not event.contains(Engine, 'begin', _request_statement_timeout):
+        event.listen(Engine, 'begin', _request_statement_timeout)
+    _use_timed_pool(app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {}), 'default')
+    for name, bind in (app.config.get('SQLALCHEMY_BINDS') or {}).items():
+        if isinstance(bind, dict):
+            _use_timed_pool(bind, name)
+
+    @app.teardown_appcontext
+    def _remove_read_session(exc):
+        session = app.extensions.get('read_session')
+        if session is not None:
+            session.remove()
+
+_read_session_lock = threading.Lock()
+
+def read_session():
+    """列表與統計查詢使用的 session
+
+    有設定唯讀副本（DATABASE_REPLICA_URL）時連到副本，否則就是 db.session。
+    副本可能稍微落後，剛寫入的資料要等複寫追上才會出現在列表中；寫入一律使用 db.session。
+    """
+    if REPLICA_BIND not in (current_app.config.get('SQLALCHEMY_BINDS') or {}):
+        return db.session
+    session = current_app.extensions.get('read_session')
+    if session is None:
+        with _read_session_lock:
+            session = current_app.extensions.get('read_session')
+            if session is None:
+                factory = sessionmaker(bind=db.engines[REPLICA_BIND], expire_on_commit=False)
+                session = current_app.extensions['read_session'] = scoped_session(factory)
+    return session
+
+def pool_status():
+    """各連線池目前的狀態，給 /metrics 使用"""
+    status = {}
+    for name, engine in db.engines.items():
+        pool = engine.pool
+        if isinstance(pool, QueuePool):
+            status[name or 'default'] = {
+                'size': pool.size(),
+                'checked_out': pool.checkedout(),
+                'overflow': pool.overflow(),
+                'idle': pool.checkedin(),
+            }
+    return status
@@ -0,0 +1,86 @@
+import hashlib, threading
+from flask import current_app
+from markupsafe import Markup
+from .cache import TTLCache
+from .http_cache import asset_fingerprint, url_epoch
+from . import metrics
+
+class MemoryBackend:
+    """行程內 LRU 後端；get / set / delete 與 redis-py 相同，可以直接換成 redis.Redis"""
+    def __init__(self, maxsize=4096):
+        self._cache = TTLCache(None, maxsize=maxsize)
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value, ex=None):
+        self._cache.set(key, value, ttl=ex)
+
+    def delete(self, key):
+        self._cache.delete(key)
+
+def _redis_backend(url):
+    try:
+        import redis
+    except ImportError as e:
+        raise RuntimeError('FRAGMENT_CACHE_URL 需要安裝 redis 套件') from e
+    return redis.Redis.from_url(url, decode_responses=True)
+
+_backend_lock = threading.Lock()
+
+def fragment_backend():
+    """目前 app 的片段快取後端，第一次使用時依 FRAGMENT_CACHE_URL 建立"""
+    extensions = current_app.extensions
+    backend = extensions.get('fragment_cache')
+    if backend is None:
+        with _backend_lock:
+            backend = extensions.get('fragment_cache')
+            if backend is None:
+                url = current_app.config.get('FRAGMENT_CACHE_URL')
+                backend = _redis_backend(url) if url else MemoryBackend(
+                    current_app.config.get('FRAGMENT_CACHE_SIZE', 4096)
+                )
+                extensions['fragment_cache'] = backend
+    return backend
+
+def row_version(row):
+    """紀錄所有欄位值的摘要；任何欄位改變（處理完成、換圖、改描述）都會得到新的版本"""
+    values = [repr(getattr(row, column.key)) for column in row.__table__.columns]
+    return hashlib.sha1('|'.join(values).encode()).hexdigest()[:16]
+
+def fragment_key(name, row):
+    """片段名稱 + 紀錄 id 與版本 + 版面指紋 + presigned URL 時段，後兩者改變時所有片段自然失效"""
+    config = current_app.config
+    return f"fragment:{name}:{row.id}:{row_version(row)}:{asset_fingerprint()}:{url_epoch(config)}"
+
+def cached_fragment(name, row, caller):
+    """快取一段以單筆紀錄渲染的 HTML
+
+        {% call cached_fragment('birthday-card', photo) %} ... {% endcall %}
+
+    區塊內容只能依賴 row 本身（不要用 loop.index 之類的位置資訊）。
+    命中率記錄在 metrics 的 cache_fragment_hits / cache_fragment_misses；後端故障時直接渲染。
+    """
+    config = current_app.config
+    if not config.get('FRAGMENT_CACHE_ENABLED', True):
+        return caller()
+    backend = fragment_backend()
+    key = fragment_key(name, row)
+    try:
+        html = backend.get(key)
+    except Exception as e:
+        current_app.logger.warning(f"Fragment cache read failed: {e}")
+        metrics.inc('fragment_cache_errors')
+        return caller()
+    if html is not None:
+        metrics.inc('cache_fragment_hits')
+        return Markup(html)
+
+    metrics.inc('cache_fragment_misses')
+    html = caller()
+    try:
+        backend.set(key, str(html), ex=config.get('FRAGMENT_CACHE_TTL', 24 * 3600))
+    except Exception as e:
+        current_app.logger.warning(f"Fragment cache write failed: {e}")
+        metrics.inc('fragment_cache_errors')
+    return html
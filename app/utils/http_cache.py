@@ -0,0 +1,121 @@
+import hashlib, os, time
+from datetime import datetime, timezone
+from functools import wraps
+from itertools import chain
+from flask import current_app, request, session, make_response
+from sqlalchemy import event, select
+from ..extensions import db
+from ..models import CollectionVersion, Photo, BirthPhoto
+from . import metrics
+from .database import read_session
+
+# 內容會出現在頁面上的資料表；任何寫入都會遞增 collection_version
+TRACKED_MODELS = (Photo, BirthPhoto)
+
+def _bump_versions(session, flush_context, instances):
+    """flush 前替有變動的資料表遞增版本號，與資料寫入在同一個交易中，所有 worker 都看得到"""
+    names = {
+        obj.__tablename__
+        for obj in chain(session.new, session.dirty, session.deleted)
+        if isinstance(obj, TRACKED_MODELS)
+    }
+    if not names:
+        return
+    table = CollectionVersion.__table__
+    connection = session.connection()
+    now = datetime.utcnow()
+    for name in sorted(names):
+        result = connection.execute(
+            table.update().where(table.c.name == name).values(version=table.c.version + 1, updated_at=now)
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(name=name, version=1, updated_at=now))
+
+def _asset_fingerprint(app):
+    """模板與靜態檔的修改時間摘要，部署新版面時 ETag 會跟著改變"""
+    digest = hashlib.sha1()
+    for folder in (app.template_folder, app.static_folder):
+        for root, dirs, files in os.walk(folder or ''):
+            dirs.sort()
+            for name in sorted(files):
+                stat = os.stat(os.path.join(root, name))
+                digest.update(f"{name}:{stat.st_mtime_ns}:{stat.st_size};".encode())
+    return digest.hexdigest()[:16]
+
+def init_http_cache(app):
+    """註冊版本號的 flush 事件並計算版面指紋"""
+    if not event.contains(db.session, 'before_flush', _bump_versions):
+        event.listen(db.session, 'before_flush', _bump_versions)
+    app.extensions['http_cache.fingerprint'] = _asset_fingerprint(app)
+
+def asset_fingerprint():
+    """目前版面（模板與靜態檔）的指紋"""
+    return current_app.extensions.get('http_cache.fingerprint', '')
+
+def collection_versions(models):
+    """一次查出多個資料表的 {名稱: (版本號, 最後修改時間)}
+
+    與列表查詢使用同一個 session：有唯讀副本時，ETag 對應的是副本上實際會被渲染的內容。
+    """
+    if not models:
+        return {}
+    names = [model.__tablename__ for model in models]
+    rows = read_session().execute(
+        select(CollectionVersion.name, CollectionVersion.version, CollectionVersion.updated_at)
+        .where(CollectionVersion.name.in_(names))
+    ).all()
+    return {name: (version, updated_at) for name, version, updated_at in rows}
+
+def url_epoch(config):
+    """未設定公開網址時，頁面中的 presigned URL 會過期；每 R2_PRESIGN_REFRESH_MARGIN 秒換一次 ETag，
+    確保瀏覽器沿用的舊頁面裡的網址仍然有效"""
+    if config.get('R2_PUBLIC_BASE_URL'):
+        return 0
+    return int(time.time() // max(config.get('R2_PRESIGN_REFRESH_MARGIN', 24 * 3600), 1))
+
+def _etag(versions, extra=''):
+    config = current_app.config
+    parts = [
+        asset_fingerprint(),
+        extra,
+        request.full_path,
+        str(url_epoch(config)),
+    ] + [f"{name}={version}" for name, (version, _) in sorted(versions.items())]
+    return hashlib.sha1('|'.join(parts).encode()).hexdigest()
+
+def _not_modified(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if request.if_modified_since and last_modified:
+        return last_modified.replace(microsecond=0, tzinfo=timezone.utc) <= request.if_modified_since
+    return False
+
+def conditional(*models, extra=''):
+    """以資料表版本號產生 strong ETag 與 Last-Modified
+
+    內容沒有變動時直接回應 304，不執行 view、不渲染模板，只多一次查詢版本號；
+    沒有指定資料表時 ETag 只由版面指紋與 extra（頁面內容的其他來源）決定，完全不查詢資料庫。
+    有待顯示的 flash 訊息時一律重新渲染，也不帶 ETag。
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not current_app.config.get('HTTP_CACHE_ENABLED', True) or session.get('_flashes'):
+                return view(*args, **kwargs)
+            versions = collection_versions(models)
+            etag = _etag(versions, extra)
+            last_modified = max((updated_at for _, updated_at in versions.values()), default=None)
+            if _not_modified(etag, last_modified):
+                metrics.inc('http_not_modified')
+                response = current_app.response_class(status=304)
+            else:
+                metrics.inc('http_rendered')
+                response = make_response(view(*args, **kwargs))
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            # 瀏覽器可以快取，但每次使用前都要回來驗證
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
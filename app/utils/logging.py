@@ -1,26 +1,178 @@
-import logging
-from logging.handlers import RotatingFileHandler
-import os
+import atexit, copy, json, logging, os, queue, random, re, uuid, zlib
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, WatchedFileHandler
+from flask import g, request
+from flask.logging import default_handler
+
+# 目前請求（或由請求送出的背景工作）的 request id
+request_id_var = ContextVar('request_id', default=None)
+
+# 外部傳入的 X-Request-ID 只接受這些字元，避免把任意內容寫進日誌
+_REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+# LogRecord 內建的欄位，其餘的（logger.info(..., extra={...})）會一起輸出到 JSON
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'request_id'}
+
+def current_request_id():
+    return request_id_var.get()
+
+class RequestIdFilter(logging.Filter):
+    """在每筆紀錄加上 request_id（不在請求中時為 -）"""
+    def filter(self, record):
+        record.request_id = request_id_var.get() or '-'
+        return True
+
+class DebugSamplingFilter(logging.Filter):
+    """只保留 rate 比例的 DEBUG 紀錄
+
+    同一個 request id 的 DEBUG 紀錄一起保留或一起捨棄，被取樣到的請求仍然看得到完整過程。
+    """
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.rate >= 1:
+            return True
+        request_id = request_id_var.get()
+        if request_id is None:
+            return random.random() < self.rate
+        return zlib.crc32(request_id.encode()) % 10000 < self.rate * 10000
+
+class JsonFormatter(logging.Formatter):
+    """一行一個 JSON 物件"""
+    def format(self, record):
+        data = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'module': record.module,
+            'pid': record.process,
+            'request_id': getattr(record, 'request_id', '-'),
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith('_'):
+                data[key] = value if isinstance(value, (str, int, float, bool, type(None))) else repr(value)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exc'] = record.exc_text
+        return json.dumps(data, ensure_ascii=False)
+
+class _PreparedQueueHandler(QueueHandler):
+    """在呼叫端只把訊息與例外轉成字串就放進佇列，排版與寫檔都交給 listener 執行緒"""
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+_listener = None
+_installed = []   # (logger, handler)：重新設定時先移除
+
+def _start_listener(handlers):
+    global _listener
+    log_queue = queue.SimpleQueue()
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return log_queue
+
+def _stop_listener():
+    global _listener
+    if _listener is not None:
+        _listener.stop()   # 送出佇列中剩下的紀錄
+        _listener = None
+
+def _restart_after_fork():
+    """fork 出來的 worker 沒有 listener 執行緒，建立新的佇列與執行緒"""
+    global _listener
+    if _listener is None:
+        return
+    handlers = _listener.handlers
+    _listener = None
+    log_queue = _start_listener(handlers)
+    for _, handler in _installed:
+        if isinstance(handler, QueueHandler):
+            handler.queue = log_queue
+
+os.register_at_fork(after_in_child=_restart_after_fork)
+atexit.register(_stop_listener)
+
+def _file_handler(config):
+    path = config.get('LOG_FILE')
+    if not path:
+        return None
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if config.get('LOG_FILE_ROTATION') == 'internal':
+        # 行程內依大小輪替只適用單一行程：多個 worker 各自輪替同一個檔案會互相覆蓋備份檔
+        return RotatingFileHandler(path, maxBytes=config.get('LOG_FILE_MAX_BYTES', 1024*1024),
+                                   backupCount=config.get('LOG_FILE_BACKUP_COUNT', 5))
+    # 多個 worker 以 append 寫入同一個檔案，輪替交給 logrotate，檔案被移走後自動重新開啟
+    return WatchedFileHandler(path)
+
+def _init_request_id(app):
+    @app.before_request
+    def _assign_request_id():
+        incoming = request.headers.get('X-Request-ID', '')
+        g.request_id = incoming if _REQUEST_ID_PATTERN.match(incoming) else uuid.uuid4().hex[:16]
+        request_id_var.set(g.request_id)
+
+    @app.after_request
+    def _echo_request_id(response):
+        if 'request_id' in g:
+            response.headers['X-Request-ID'] = g.request_id
+        return response
+
+    @app.teardown_request
+    def _clear_request_id(exc):
+        request_id_var.set(None)
 
 def setup_logging(app):
-    level = logging.DEBUG if app.config.get('DEBUG') else logging.INFO
-    formatter = logging.Formatter('[%(asctime)s] %(levelname)s in %(module)s: %(message)s')
+    """設定 app.logger
+
+    LOG_FORMAT=json 時輸出一行一個 JSON，否則為文字；每筆紀錄都帶 request id（回應標頭 X-Request-ID）。
+    LOG_QUEUE 開啟時請求中只把紀錄放進佇列，由背景執行緒寫入 console 與檔案。
+    """
+    config = app.config
+    level = logging.DEBUG if config.get('DEBUG') else logging.INFO
+    if config.get('LOG_FORMAT') == 'json':
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter('[%(asctime)s] %(levelname)s in %(module)s [%(request_id)s]: %(message)s')
+
+    # 重新建立 app 時（測試、CLI）移除上一次加上的 handler
+    for logger, handler in _installed:
+        logger.removeHandler(handler)
+    _installed.clear()
+    _stop_listener()
+    app.logger.removeHandler(default_handler)
 
-    # Console handler
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(level)
-    console_handler.setFormatter(formatter)
+    handlers = [logging.StreamHandler()]
+    file_handler = _file_handler(config)
+    if file_handler is not None:
+        handlers.append(file_handler)
+    for handler in handlers:
+        handler.setLevel(level)
+        handler.setFormatter(formatter)
+
+    if config.get('LOG_QUEUE', True):
+        targets = [_PreparedQueueHandler(_start_listener(handlers))]
+    else:
+        targets = handlers
+    for handler in targets:
+        # filter 要在呼叫端執行：request id 存在請求的 context 中，取樣也應該在排入佇列前完成
+        handler.addFilter(RequestIdFilter())
+        handler.addFilter(DebugSamplingFilter(config.get('LOG_DEBUG_SAMPLE_RATE', 1.0)))
+        app.logger.addHandler(handler)
+        _installed.append((app.logger, handler))
     app.logger.setLevel(level)
-    app.logger.addHandler(console_handler)
-
-    # File handler
-    logs_dir = os.path.join(os.getcwd(), 'logs')
-    if not os.path.exists(logs_dir):
-        os.mkdir(logs_dir)
-    file_handler = RotatingFileHandler(os.path.join(logs_dir, 'app.log'), maxBytes=1024*1024, backupCount=5)
-    file_handler.setLevel(level)
-    file_handler.setFormatter(formatter)
-    app.logger.addHandler(file_handler)
+
+    _init_request_id(app)
 
     # 降低 SQLAlchemy 引擎日誌噪音
     logging.getLogger('sqlalchemy.engine').setLevel(logging.WARNING)
@@ -0,0 +1,92 @@
+import re, threading
+
+# 行程內的簡易計數器與直方圖（每個 gunicorn worker 各自一份）
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}   # (名稱, 排序後的標籤) -> [各桶累計次數, 總和, 次數]
+
+# 延遲直方圖的桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def inc(name, amount=1):
+    """累加計數器"""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+def get(name):
+    with _lock:
+        return _counters.get(name, 0)
+
+def snapshot():
+    """取得目前所有計數器的副本"""
+    with _lock:
+        return dict(_counters)
+
+def observe(name, value, **labels):
+    """記錄一次觀測值（例如秒數）到直方圖"""
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        entry = _histograms.get(key)
+        if entry is None:
+            entry = _histograms[key] = [[0] * len(DEFAULT_BUCKETS), 0.0, 0]
+        for i, bound in enumerate(DEFAULT_BUCKETS):
+            if value <= bound:
+                entry[0][i] += 1
+        entry[1] += value
+        entry[2] += 1
+
+def histograms():
+    """取得目前所有直方圖的副本：{(名稱, 標籤): (各桶次數, 總和, 次數)}"""
+    with _lock:
+        return {key: (list(buckets), total, count) for key, (buckets, total, count) in _histograms.items()}
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+def hit_rates():
+    """各快取的命中率，由 cache_<name>_hits / cache_<name>_misses 計算"""
+    counters = snapshot()
+    rates = {}
+    for key, hits in counters.items():
+        if key.startswith('cache_') and key.endswith('_hits'):
+            name = key[len('cache_'):-len('_hits')]
+            total = hits + counters.get(f'cache_{name}_misses', 0)
+            rates[name] = round(hits / total, 4) if total else 0.0
+    return rates
+
+def _metric_name(prefix, name):
+    return f"{prefix}_{re.sub(r'[^a-zA-Z0-9_]', '_', name)}"
+
+def _format_labels(labels):
+    escaped = (
+        (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}' if labels else ''
+
+def prometheus_text(prefix='internetcorner'):
+    """以 Prometheus 文字格式輸出計數器與直方圖
+
+    數值只屬於回應這次抓取的 worker；多個 worker 時請以 pid 標籤區分或改用單一 worker 抓取。
+    """
+    lines = []
+    for name, value in sorted(snapshot().items()):
+        metric = _metric_name(prefix, name) + '_total'
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {value}")
+
+    by_name = {}
+    for (name, labels), data in histograms().items():
+        by_name.setdefault(name, []).append((labels, data))
+    for name, series in sorted(by_name.items()):
+        metric = _metric_name(prefix, name)
+        lines.append(f"# TYPE {metric} histogram")
+        for labels, (buckets, total, count) in sorted(series):
+            for bound, bucket_count in zip(DEFAULT_BUCKETS, buckets):
+                lines.append(f"{metric}_bucket{_format_labels(labels + (('le', repr(bound)),))} {bucket_count}")
+            lines.append(f"{metric}_bucket{_format_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {count}")
+    return '\n'.join(lines) + '\n'
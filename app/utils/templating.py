@@ -0,0 +1,49 @@
+from ..services.storage import resolve_url
+from .fragments import cached_fragment
+
+# <picture> 中 <source> 的優先順序（越前面通常越小）
+SOURCE_TYPES = [('avif', 'image/avif'), ('webp', 'image/webp')]
+
+def photo_url(photo):
+    """照片主圖網址；依 object_key 即時解析，不使用資料庫中可能已過期的 url 欄位"""
+    return resolve_url(photo.object_key)
+
+def image_srcset(photo, fmt=None):
+    """產生 <img srcset> 內容，預設為主圖格式；舊照片沒有衍生圖時回傳空字串"""
+    variants = photo.variants or []
+    if not variants:
+        return ''
+    fmt = fmt or variants[0]['format']
+    matched = sorted((v for v in variants if v['format'] == fmt), key=lambda v: v['width'])
+    return ', '.join(f"{resolve_url(v['key'])} {v['width']}w" for v in matched)
+
+def image_sources(photo):
+    """產生 <picture> 的 (MIME, srcset) 列表，只包含主圖以外的新格式"""
+    variants = photo.variants or []
+    if not variants:
+        return []
+    main_format = variants[0]['format']
+    available = {v['format'] for v in variants}
+    return [
+        (mime, image_srcset(photo, fmt))
+        for fmt, mime in SOURCE_TYPES
+        if fmt in available and fmt != main_format
+    ]
+
+def image_payload(photo):
+    """前端分頁載入時使用的圖片資料（網址、srcset 與新格式來源）"""
+    return {
+        'id': photo.id,
+        'status': photo.status,
+        'url': photo_url(photo),
+        'srcset': image_srcset(photo),
+        'sources': [{'type': mime, 'srcset': srcset} for mime, srcset in image_sources(photo)],
+        'uploaded_at': photo.uploaded_at.isoformat() if photo.uploaded_at else None,
+    }
+
+def register_template_helpers(app):
+    """註冊模板共用函式"""
+    app.add_template_global(photo_url)
+    app.add_template_global(image_srcset)
+    app.add_template_global(image_sources)
+    app.add_template_global(cached_fragment)
@@ -0,0 +1,122 @@
+import time
+from contextlib import contextmanager
+from functools import wraps
+from flask import current_app, g, has_request_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from . import metrics
+
+def _request_spans():
+    """目前請求累計的 {span 名稱: [毫秒, 次數]}；不在請求中（背景工作）時回傳 None"""
+    if not has_request_context() or '_timing_start' not in g:
+        return None
+    return g.setdefault('_timing_spans', {})
+
+def record(name, seconds):
+    """記錄一段耗時：寫入 span_duration_seconds 直方圖，請求中時也累計到 Server-Timing"""
+    metrics.observe('span_duration_seconds', seconds, span=name)
+    spans = _request_spans()
+    if spans is not None:
+        entry = spans.setdefault(name, [0.0, 0])
+        entry[0] += seconds * 1000
+        entry[1] += 1
+
+@contextmanager
+def span(name):
+    """量測區塊耗時；同名 span 巢狀時只計算最外層，避免重複累計"""
+    active = g.setdefault('_timing_active', set()) if has_request_context() else None
+    if active is not None and name in active:
+        yield
+        return
+    if active is not None:
+        active.add(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+        if active is not None:
+            active.discard(name)
+
+def timed(name):
+    """以 span 包住整個函式的裝飾器"""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# ---- SQLAlchemy：每個查詢的執行時間 ----
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_timing_query_start', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('_timing_query_start')
+    if starts:
+        record('db', time.perf_counter() - starts.pop())
+
+def _handle_error(exception_context):
+    # 查詢失敗時不會觸發 after_cursor_execute，丟掉對應的開始時間
+    starts = exception_context.connection.info.get('_timing_query_start') if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+# ---- Jinja：模板渲染時間（包含被 include 的子模板，只計算最外層） ----
+
+def _before_render(sender, template, context, **extra):
+    if _request_spans() is not None:
+        g.setdefault('_timing_templates', []).append(time.perf_counter())
+
+def _after_render(sender, template, context, **extra):
+    starts = g.get('_timing_templates') if has_request_context() else None
+    if starts:
+        start = starts.pop()
+        if not starts:
+            record('template', time.perf_counter() - start)
+
+# ---- 請求 ----
+
+def _start_request():
+    g._timing_start = time.perf_counter()
+
+def _server_timing(spans, total_ms):
+    parts = [
+        f'{name};dur={ms:.1f};desc="{count}x"' if count > 1 else f'{name};dur={ms:.1f}'
+        for name, (ms, count) in sorted(spans.items())
+    ]
+    parts.append(f'total;dur={total_ms:.1f}')
+    return ', '.join(parts)
+
+def _finish_request(response):
+    start = g.pop('_timing_start', None)
+    if start is None:
+        return response
+    elapsed = time.perf_counter() - start
+    endpoint = request.endpoint or 'unmatched'
+    metrics.observe('http_request_duration_seconds', elapsed,
+                    endpoint=endpoint, method=request.method, status=response.status_code)
+    if current_app.config.get('SERVER_TIMING_HEADER', True):
+        response.headers['Server-Timing'] = _server_timing(g.get('_timing_spans', {}), elapsed * 1000)
+    return response
+
+_engine_hooked = False
+
+def init_timing(app):
+    """註冊請求計時、SQL 與模板渲染的量測"""
+    global _engine_hooked
+    if not app.config.get('TIMING_ENABLED', True):
+        return
+    if not _engine_hooked:
+        # 掛在 Engine 類別上，之後新增的 engine（例如唯讀副本）也會被量測
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+        _engine_hooked = True
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
@@ -0,0 +1,51 @@
+"""比較兩次 run.py 或 concurrency.py 的結果
+
+    python benchmarks/compare.py before.json after.json [--metric p95_ms]
+
+每一列顯示兩次的數值與變化百分比，延遲變慢超過 --threshold 時標示 ⚠️。
+"""
+import argparse, json
+
+def _rows(report, metric):
+    rows = {}
+    for name, result in report.get('http', {}).items():
+        rows[name] = result.get(metric)
+    # concurrency.py 的結果依 worker 模式分組
+    for mode, results in report.get('modes', {}).items():
+        for name, result in results.items():
+            rows[f'{mode} {name}'] = result.get(metric)
+    for size, result in report.get('imaging', {}).items():
+        rows[f'imaging {size} decode+resize'] = result['decode_resize'].get(metric)
+        for fmt, encode in result['encode'].items():
+            rows[f'imaging {size} encode {fmt}'] = encode.get(metric)
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='比較兩份基準測試結果')
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--metric', default='p50_ms', help='比較的欄位，例如 p50_ms、p95_ms、throughput_rps')
+    parser.add_argument('--threshold', type=float, default=10.0, help='標示退步的百分比')
+    args = parser.parse_args(argv)
+
+    with open(args.before, encoding='utf-8') as f:
+        before = json.load(f)
+    with open(args.after, encoding='utf-8') as f:
+        after = json.load(f)
+    print(f"{before['meta'].get('commit')} -> {after['meta'].get('commit')} ({args.metric})")
+
+    # 吞吐量越大越好，其餘（延遲）越小越好
+    higher_is_better = args.metric == 'throughput_rps'
+    old_rows, new_rows = _rows(before, args.metric), _rows(after, args.metric)
+    for name in list(old_rows) + [n for n in new_rows if n not in old_rows]:
+        old, new = old_rows.get(name), new_rows.get(name)
+        if not old or new is None:
+            print(f"{name:<40} {old!s:>10} {new!s:>10}")
+            continue
+        change = (new - old) / old * 100
+        worse = -change if higher_is_better else change
+        flag = ' ⚠️' if worse > args.threshold else ''
+        print(f"{name:<40} {old:>10} {new:>10} {change:+7.1f}%{flag}")
+
+if __name__ == '__main__':
+    main()
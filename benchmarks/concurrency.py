@@ -0,0 +1,194 @@
+"""並行負載基準測試：比較 gunicorn 的 worker 模式
+
+以 moto 取代 R2、寫入測試資料後，對每個模式實際啟動 gunicorn（使用專案的 gunicorn.conf.py），
+在每個並行數下同時送出請求，量測頁面、統計 API、上傳與刪除的吞吐量與 p50 / p95 / p99 延遲。
+
+    pip install -r requirements-dev.txt
+    python benchmarks/concurrency.py --modes sync:4 gthread:1x4 --concurrency 1 8 32
+    python benchmarks/compare.py benchmarks/results/a-concurrency.json benchmarks/results/b-concurrency.json
+
+模式格式：sync:<worker 數> 或 gthread:<worker 數>x<每個 worker 的執行緒數>。
+sync 模式下超過 worker 數的請求只能排隊；gthread 模式的行程數較少，比較時應同時注意記憶體用量。
+最後印出各模式並排的吞吐量與 p95；JSON 的 modes 欄位依模式存放結果，compare.py 可比較兩次執行。
+"""
+import argparse, json, os, platform, signal, subprocess, sys, tempfile, time, urllib.error, urllib.request, uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from run import ROOT, _free_port, _git_commit, jpeg_bytes, measure, seed, start_s3
+
+def parse_mode(text):
+    """'sync:4' -> ('sync', 4, 1)；'gthread:2x8' -> ('gthread', 2, 8)"""
+    worker_class, _, size = text.partition(':')
+    workers, _, threads = (size or '1').partition('x')
+    if worker_class not in ('sync', 'gthread'):
+        raise argparse.ArgumentTypeError(f'不支援的 worker 模式：{worker_class}')
+    return worker_class, int(workers), int(threads or 1)
+
+def mode_label(mode):
+    worker_class, workers, threads = mode
+    return f'{worker_class} {workers}x{threads}'
+
+def start_gunicorn(mode, port, log):
+    """啟動 gunicorn 並等到可以回應；app 與 gunicorn 的輸出寫到 log 檔，避免干擾量測結果的輸出"""
+    worker_class, workers, threads = mode
+    env = dict(os.environ, GUNICORN_WORKER_CLASS=worker_class, GUNICORN_THREADS=str(threads))
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'wsgi:app', '--bind', f'127.0.0.1:{port}',
+         '--workers', str(workers), '--log-level', 'warning'],
+        cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'gunicorn 啟動失敗（{mode_label(mode)}），請查看 {log.name}')
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/metrics/', timeout=1).close()
+            return process
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f'gunicorn 在 60 秒內沒有回應（{mode_label(mode)}）')
+
+def stop_gunicorn(process):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # 上傳與刪除成功時回 302，量測的是這個請求本身，不跟著載入下一頁
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+_opener = urllib.request.build_opener(_NoRedirect)
+
+def request(url, data=None, headers=None):
+    """送出請求並讀完回應，回傳 HTTP 狀態碼（每次都是新的連線，與瀏覽器經過代理時相近）"""
+    try:
+        with _opener.open(urllib.request.Request(url, data=data, headers=headers or {}), timeout=120) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        e.read()
+        return e.code
+
+def multipart(filename, content):
+    boundary = uuid.uuid4().hex
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="photos"; filename="{filename}"\r\n'
+            f'Content-Type: image/jpeg\r\n\r\n').encode() + content + f'\r\n--{boundary}--\r\n'.encode()
+    return body, {'Content-Type': f'multipart/form-data; boundary={boundary}'}
+
+def bench_mode(app, mode, args, log):
+    from app.models import Photo
+
+    port = _free_port()
+    base = f'http://127.0.0.1:{port}'
+    print(f'== {mode_label(mode)}')
+    upload_image = jpeg_bytes((args.upload_width, args.upload_width * 3 // 4))
+    results = {}
+    process = start_gunicorn(mode, port, log)
+    try:
+        for concurrency in args.concurrency:
+            prefix = f'c={concurrency}'
+            for path in ('/memory/', '/birthday/', '/birthday/api/stats'):
+                name = f'{prefix} GET {path}'
+                results[name] = measure(name, args.requests, lambda i, path=path: request(base + path),
+                                        concurrency, args.warmup)
+
+            def upload(i, prefix=prefix):
+                # 每次都是不同的內容，不會被當成重複上傳
+                body, headers = multipart(f'{prefix}-{i}.jpg', upload_image + i.to_bytes(4, 'big'))
+                return request(base + '/upload/', body, headers)
+
+            name = f'{prefix} POST /upload/'
+            results[name] = measure(name, args.uploads, upload, concurrency)
+
+            with app.app_context():
+                ids = [photo_id for (photo_id,) in Photo.query.with_entities(Photo.id)
+                       .order_by(Photo.id.desc()).limit(args.uploads).all()]
+            name = f'{prefix} POST /delete/<id>'
+            results[name] = measure(name, len(ids), lambda i: request(f'{base}/delete/{ids[i]}', b''),
+                                    concurrency)
+    finally:
+        stop_gunicorn(process)
+    return results
+
+def print_summary(modes):
+    """每個請求一列，各模式的吞吐量（req/s）與 p95（ms）並排"""
+    labels = list(modes)
+    print(f"\n{'':<32}" + ''.join(f'{label:>26}' for label in labels))
+    for name in modes[labels[0]]:
+        cells = []
+        for label in labels:
+            result = modes[label].get(name) or {}
+            cells.append(f"{result.get('throughput_rps')!s:>10} req/s {result.get('p95_ms')!s:>8} ms")
+        print(f'{name:<32}' + ''.join(f'{cell:>26}' for cell in cells))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='InternetCorner 並行負載基準測試')
+    parser.add_argument('--modes', type=parse_mode, nargs='+',
+                        default=[('sync', 4, 1), ('gthread', 1, 4)], help='例如 sync:4 gthread:2x8')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32], help='同時送出的請求數')
+    parser.add_argument('--database', help='資料庫 URL（預設為暫存的 SQLite 檔案）；會清空資料表')
+    parser.add_argument('--photos', type=int, default=200, help='寫入的回憶照片數')
+    parser.add_argument('--birthday-photos', type=int, default=200, help='寫入的生日照片數')
+    parser.add_argument('--requests', type=int, default=200, help='每個並行數下每個頁面的請求數')
+    parser.add_argument('--warmup', type=int, default=10, help='每個頁面先送出、不計入結果的請求數')
+    parser.add_argument('--uploads', type=int, default=16, help='每個並行數下的上傳（與刪除）次數')
+    parser.add_argument('--upload-width', type=int, default=1600, help='上傳測試圖片的寬度（4:3）')
+    parser.add_argument('--output', help='結果 JSON 路徑（預設 benchmarks/results/<時間>-<commit>-concurrency.json）')
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    server = start_s3()
+    tmp = tempfile.TemporaryDirectory()
+    os.environ.update(
+        DATABASE_URL=args.database or f"sqlite:///{os.path.join(tmp.name, 'bench.db')}",
+        # 上傳在請求中同步完成，量到的是完整處理時間
+        JOB_QUEUE_ENABLED='false',
+        FLASK_ENV='production',
+        SECRET_KEY='benchmark',
+        LOG_FILE=os.path.join(tmp.name, 'app.log'),
+    )
+
+    try:
+        from app import create_app
+        app = create_app('production')
+        seed(app, args.photos, args.birthday_photos)
+        report = {
+            'meta': {
+                'commit': _git_commit(),
+                'timestamp': datetime.utcnow().isoformat() + 'Z',
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+                'database': app.config['SQLALCHEMY_DATABASE_URI'].split(':', 1)[0],
+                'photos': args.photos,
+                'birthday_photos': args.birthday_photos,
+                'modes': [mode_label(mode) for mode in args.modes],
+                'concurrency': args.concurrency,
+            },
+            'modes': {},
+        }
+        with open(os.path.join(tmp.name, 'gunicorn.log'), 'w') as log:
+            for mode in args.modes:
+                report['modes'][mode_label(mode)] = bench_mode(app, mode, args, log)
+    finally:
+        server.stop()
+        tmp.cleanup()
+
+    output = args.output or os.path.join(
+        ROOT, 'benchmarks', 'results',
+        f"{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}-{report['meta']['commit'] or 'unknown'}-concurrency.json"
+    )
+    print_summary(report['modes'])
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"結果已寫入 {output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,283 @@
+"""效能基準測試
+
+以 moto 啟動本機的 S3 相容服務取代 R2，用 create_app 建立完整的 app（SQLite 或本機 Postgres），
+先寫入指定數量的照片與生日照片，再量測各頁面、上傳與刪除的吞吐量與 p50 / p95 / p99 延遲，
+以及 Pillow 在各種原圖尺寸下的解碼縮圖與編碼時間。結果寫成 JSON，可以用 compare.py 比較兩次執行。
+
+    pip install -r requirements-dev.txt
+    python benchmarks/run.py --photos 500 --birthday-photos 500
+    python benchmarks/run.py --database postgresql://localhost/internetcorner_bench
+    python benchmarks/compare.py benchmarks/results/a.json benchmarks/results/b.json
+
+注意：指定 --database 時會清空該資料庫中的資料表。
+"""
+import argparse, io, json, os, platform, socket, subprocess, sys, tempfile, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUCKET = 'benchmark'
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def percentile(sorted_values, pct):
+    """nearest-rank 百分位數"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+def summarize(latencies, elapsed):
+    """延遲（秒）列表 -> 以毫秒表示的統計"""
+    values = sorted(latencies)
+    ms = lambda v: round(v * 1000, 3) if v is not None else None
+    return {
+        'count': len(values),
+        'throughput_rps': round(len(values) / elapsed, 2) if elapsed else None,
+        'mean_ms': ms(sum(values) / len(values)) if values else None,
+        'min_ms': ms(values[0]) if values else None,
+        'p50_ms': ms(percentile(values, 50)),
+        'p95_ms': ms(percentile(values, 95)),
+        'p99_ms': ms(percentile(values, 99)),
+        'max_ms': ms(values[-1]) if values else None,
+    }
+
+def jpeg_bytes(size, noise=True):
+    from PIL import Image
+    img = Image.effect_noise(size, 64).convert('RGB') if noise else Image.new('RGB', size, (120, 80, 200))
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+def start_s3():
+    """啟動 moto server 並設定 R2 相關環境變數（必須在 import app 之前）"""
+    import logging
+    from moto.server import ThreadedMotoServer
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)   # moto 每個請求的存取紀錄
+    port = _free_port()
+    server = ThreadedMotoServer(ip_address='127.0.0.1', port=port, verbose=False)
+    server.start()
+    os.environ.update(
+        R2_ENDPOINT_URL=f'http://127.0.0.1:{port}',
+        R2_ACCESS_KEY_ID='benchmark',
+        R2_SECRET_ACCESS_KEY='benchmark',
+        R2_BUCKET_NAME=BUCKET,
+        AWS_DEFAULT_REGION='us-east-1',
+    )
+    return server
+
+def seed(app, photos, birthday_photos):
+    """上傳一張真的圖片取得衍生圖，再寫入大量共用這組物件的紀錄（頁面只需要網址，不會讀取物件）"""
+    from app.extensions import db
+    from app.models import Photo, BirthPhoto, STATUS_READY
+    from app.services.storage import get_r2_client, process_image
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        get_r2_client().create_bucket(Bucket=BUCKET)
+        object_key, url, variants, phash = process_image(io.BytesIO(jpeg_bytes((2400, 1800))), 'seed.jpg')
+        start = datetime.utcnow() - timedelta(days=365)
+
+        def fields(i):
+            return dict(object_key=object_key, url=url, variants=variants, phash=phash,
+                        content_hash=f'{i:064x}', status=STATUS_READY,
+                        uploaded_at=start + timedelta(minutes=i))
+
+        db.session.add_all(Photo(**fields(i)) for i in range(photos))
+        db.session.add_all(
+            BirthPhoto(birthday_year=2015 + i % 10, birthday_date='06-26',
+                       description=f'第 {i} 張生日照片', **fields(photos + i))
+            for i in range(birthday_photos)
+        )
+        db.session.commit()
+
+def measure(name, count, call, concurrency=1, warmup=0):
+    """執行 call(i) count 次（warmup 次不計），回傳統計；call 回傳 HTTP 狀態碼時順便檢查"""
+    for i in range(warmup):
+        call(i)
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def run(i):
+        start = time.perf_counter()
+        status = call(i)
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(run, range(warmup, warmup + count)))
+    else:
+        for i in range(warmup, warmup + count):
+            run(i)
+    elapsed = time.perf_counter() - started
+    result = summarize(latencies, elapsed)
+    result['statuses'] = {str(k): v for k, v in statuses.items()}
+    print(f"{name:<24} {result['throughput_rps']:>9} req/s  p50 {result['p50_ms']:>8} ms  "
+          f"p95 {result['p95_ms']:>8} ms  p99 {result['p99_ms']:>8} ms  {result['statuses']}")
+    return result
+
+def bench_http(app, args):
+    from app.models import Photo
+    client = app.test_client()
+    clients = {}
+
+    def get(path, headers=None):
+        def call(i):
+            # 每個執行緒使用自己的 test client（cookie jar 不共用）
+            c = clients.setdefault(threading.get_ident(), app.test_client()) if args.concurrency > 1 else client
+            return c.get(path, headers=headers).status_code
+        return call
+
+    results = {}
+    for path in ('/', '/memory/', '/birthday/'):
+        results[f'GET {path}'] = measure(f'GET {path}', args.requests, get(path),
+                                         args.concurrency, args.warmup)
+        etag = client.get(path).headers.get('ETag')
+        if etag:
+            results[f'GET {path} (304)'] = measure(f'GET {path} (304)', args.requests,
+                                                   get(path, {'If-None-Match': etag}), args.concurrency, args.warmup)
+
+    uploads = [jpeg_bytes((args.upload_width, args.upload_width * 3 // 4)) for _ in range(2)]
+
+    def upload(i):
+        # 每次都是不同的內容，不會被當成重複上傳
+        data = uploads[i % 2] + i.to_bytes(4, 'big')
+        response = client.post('/upload/', data={'photos': [(io.BytesIO(data), f'bench_{i}.jpg')]},
+                               content_type='multipart/form-data')
+        return response.status_code
+
+    results['POST /upload/'] = measure('POST /upload/', args.uploads, upload, 1, 1)
+
+    # 刪除剛才上傳的照片（最新的 id），它們各自擁有 R2 物件，才量得到實際的刪除
+    with app.app_context():
+        ids = [photo_id for (photo_id,) in Photo.query.with_entities(Photo.id).order_by(Photo.id.desc())
+               .limit(args.deletes).all()]
+
+    def delete(i):
+        return client.post(f'/delete/{ids[i]}').status_code
+
+    results['POST /delete/<id>'] = measure('POST /delete/<id>', len(ids), delete)
+    return results
+
+def bench_imaging(app, args):
+    """每種原圖尺寸：解碼 + 縮出所有寬度的時間，以及每個輸出格式的編碼時間"""
+    from app.services.imaging import open_image, load_for_resize, resize
+    from app.services.storage import _encode, modern_formats
+
+    results = {}
+    with app.app_context():
+        widths = sorted(set(app.config['IMAGE_VARIANT_WIDTHS']), reverse=True)
+        formats = ['JPEG'] + modern_formats()
+        for size in args.image_sizes:
+            data = jpeg_bytes(size)
+            decode, encode = [], {fmt: [] for fmt in formats}
+            for _ in range(args.image_repeat):
+                start = time.perf_counter()
+                img = load_for_resize(open_image(io.BytesIO(data)), widths[0])
+                outputs = []
+                for width in widths:
+                    img = resize(img, width)
+                    outputs.append(img)
+                decode.append(time.perf_counter() - start)
+                for fmt in formats:
+                    start = time.perf_counter()
+                    for output in outputs:
+                        _encode(output, fmt).close()
+                    encode[fmt].append(time.perf_counter() - start)
+            label = f'{size[0]}x{size[1]}'
+            results[label] = {
+                'source_bytes': len(data),
+                'decode_resize': summarize(decode, sum(decode)),
+                'encode': {fmt.lower(): summarize(times, sum(times)) for fmt, times in encode.items()},
+            }
+            print(f"imaging {label:<12} decode+resize p50 {results[label]['decode_resize']['p50_ms']} ms  " +
+                  '  '.join(f"{fmt} p50 {r['p50_ms']} ms" for fmt, r in results[label]['encode'].items()))
+    return results
+
+def parse_size(text):
+    width, height = (int(v) for v in text.lower().split('x'))
+    return width, height
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='InternetCorner 效能基準測試')
+    parser.add_argument('--database', help='資料庫 URL（預設為暫存的 SQLite 檔案）；會清空資料表')
+    parser.add_argument('--photos', type=int, default=200, help='寫入的回憶照片數')
+    parser.add_argument('--birthday-photos', type=int, default=200, help='寫入的生日照片數')
+    parser.add_argument('--requests', type=int, default=200, help='每個頁面量測的請求數')
+    parser.add_argument('--warmup', type=int, default=10, help='每個頁面先送出、不計入結果的請求數')
+    parser.add_argument('--concurrency', type=int, default=1, help='頁面請求的並行執行緒數')
+    parser.add_argument('--uploads', type=int, default=20, help='上傳量測次數')
+    parser.add_argument('--upload-width', type=int, default=3000, help='上傳測試圖片的寬度（4:3）')
+    parser.add_argument('--deletes', type=int, default=20, help='刪除量測次數')
+    parser.add_argument('--image-sizes', type=parse_size, nargs='+',
+                        default=[(1024, 768), (2048, 1536), (4000, 3000), (8000, 6000)])
+    parser.add_argument('--image-repeat', type=int, default=5, help='每種尺寸的 Pillow 量測次數')
+    parser.add_argument('--skip-http', action='store_true')
+    parser.add_argument('--skip-imaging', action='store_true')
+    parser.add_argument('--output', help='結果 JSON 路徑（預設 benchmarks/results/<時間>-<commit>.json）')
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, ROOT)
+    # create_app 以目前目錄尋找 templates / static
+    os.chdir(ROOT)
+    server = start_s3()
+    tmp = tempfile.TemporaryDirectory()
+    os.environ['DATABASE_URL'] = args.database or f"sqlite:///{os.path.join(tmp.name, 'bench.db')}"
+    # 上傳在請求中同步完成，量到的是完整處理時間
+    os.environ['JOB_QUEUE_ENABLED'] = 'false'
+
+    try:
+        from app import create_app
+        import logging
+        app = create_app('production')
+        app.logger.setLevel(logging.WARNING)
+        seed(app, args.photos, args.birthday_photos)
+
+        from app.utils import metrics
+        metrics.reset()
+        report = {
+            'meta': {
+                'commit': _git_commit(),
+                'timestamp': datetime.utcnow().isoformat() + 'Z',
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'database': app.config['SQLALCHEMY_DATABASE_URI'].split(':', 1)[0],
+                'photos': args.photos,
+                'birthday_photos': args.birthday_photos,
+                'concurrency': args.concurrency,
+            },
+            'http': {} if args.skip_http else bench_http(app, args),
+            'imaging': {} if args.skip_imaging else bench_imaging(app, args),
+            'counters': metrics.snapshot(),
+        }
+    finally:
+        server.stop()
+        tmp.cleanup()
+
+    output = args.output or os.path.join(
+        ROOT, 'benchmarks', 'results',
+        f"{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}-{report['meta']['commit'] or 'unknown'}.json"
+    )
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"結果已寫入 {output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""gunicorn 設定（gunicorn 啟動時會自動讀取目前目錄的 gunicorn.conf.py）
+
+預設使用 --preload：master 先建立 app 並載入 boto3 / Pillow，再 fork 出 worker，
+worker 以 copy-on-write 共用這些記憶體，啟動只需要 fork 的時間。
+fork 之後每個 worker 丟掉繼承來的資料庫連線，並建立自己的 R2 client。
+
+預設使用 gthread worker：每個 worker 以 GUNICORN_THREADS 個執行緒處理請求，
+等待 R2 上傳、刪除或資料庫時只佔住一個執行緒，而不是整個行程。
+R2 client 在行程內共用（boto3 client 可跨執行緒使用），資料庫 session 依 app context 分開，
+連線池與 R2 連線數預設會配合執行緒數放大。GUNICORN_WORKER_CLASS=sync 可改回一個行程一個請求。
+"""
+import gc, os
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 8)) if worker_class == 'gthread' else 1
+
+# 在 app 讀取設定之前決定預設值：每個執行緒至少要拿得到一條資料庫連線，
+# 每個請求最多同時有 UPLOAD_WORKERS 個 R2 上傳
+os.environ.setdefault('DB_POOL_SIZE', str(max(5, threads)))
+os.environ.setdefault('R2_MAX_POOL_CONNECTIONS',
+                      str(max(20, threads * int(os.environ.get('UPLOAD_WORKERS', 4)))))
+
+def when_ready(server):
+    server.log.info(f"Serving with {worker_class} workers ({threads} threads each)")
+    if not preload_app:
+        return
+    from app.services.storage import preload_modules
+    preload_modules()
+    # 把目前的物件移出 GC 追蹤，避免 worker 中的 GC 掃描觸碰共用頁面而觸發複製
+    gc.freeze()
+    server.log.info("Preloaded boto3 and Pillow in the master process")
+
+def post_fork(server, worker):
+    from wsgi import app
+    from app.extensions import db
+    from app.services.storage import init_storage
+    from app.services.image_jobs import start_reconciler
+    with app.app_context():
+        # 不關閉父行程的連線（close=False），只讓這個 worker 重新建立自己的連線池
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    init_storage(app)
+    # 工作佇列只在記憶體中，定期接手其他（已經結束的）worker 遺留的上傳
+    start_reconciler(app)
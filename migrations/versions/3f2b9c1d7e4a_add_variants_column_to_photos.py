@@ -0,0 +1,32 @@
+"""Add variants column to photo and birth_photo
+
+Revision ID: 3f2b9c1d7e4a
+Revises: a61c685260ea
+Create Date: 2026-10-18 09:12:40.118203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f2b9c1d7e4a'
+down_revision = 'a61c685260ea'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('photo', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('variants', sa.JSON(), nullable=True))
+
+    with op.batch_alter_table('birth_photo', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('variants', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('birth_photo', schema=None) as batch_op:
+        batch_op.drop_column('variants')
+
+    with op.batch_alter_table('photo', schema=None) as batch_op:
+        batch_op.drop_column('variants')
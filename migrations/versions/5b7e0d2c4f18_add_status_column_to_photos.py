@@ -0,0 +1,32 @@
+"""Add processing status column to photos
+
+Revision ID: 5b7e0d2c4f18
+Revises: 8c41e6a09b5d
+Create Date: 2026-10-18 11:26:40.318274
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b7e0d2c4f18'
+down_revision = '8c41e6a09b5d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('photo', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('status', sa.String(length=16), nullable=False, server_default='ready'))
+
+    with op.batch_alter_table('birth_photo', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('status', sa.String(length=16), nullable=False, server_default='ready'))
+
+
+def downgrade():
+    with op.batch_alter_table('birth_photo', schema=None) as batch_op:
+        batch_op.drop_column('status')
+
+    with op.batch_alter_table('photo', schema=None) as batch_op:
+        batch_op.drop_column('status')
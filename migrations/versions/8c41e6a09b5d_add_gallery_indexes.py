@@ -0,0 +1,32 @@
+"""Add indexes for gallery sorting and filtering
+
+Revision ID: 8c41e6a09b5d
+Revises: 3f2b9c1d7e4a
+Create Date: 2026-10-18 10:03:17.552910
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c41e6a09b5d'
+down_revision = '3f2b9c1d7e4a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('photo', schema=None) as batch_op:
+        batch_op.create_index('ix_photo_uploaded_at_id', ['uploaded_at', 'id'], unique=False)
+
+    with op.batch_alter_table('birth_photo', schema=None) as batch_op:
+        batch_op.create_index('ix_birth_photo_year_uploaded_at_id', ['birthday_year', 'uploaded_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('birth_photo', schema=None) as batch_op:
+        batch_op.drop_index('ix_birth_photo_year_uploaded_at_id')
+
+    with op.batch_alter_table('photo', schema=None) as batch_op:
+        batch_op.drop_index('ix_photo_uploaded_at_id')
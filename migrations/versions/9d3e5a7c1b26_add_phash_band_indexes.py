@@ -0,0 +1,35 @@
+"""Add perceptual hash band indexes for near-duplicate lookups
+
+Each 16-hex-digit phash is split into 8 two-character bands, each with an
+expression index, so uploads only compare against photos sharing a band.
+
+Revision ID: 9d3e5a7c1b26
+Revises: f5d18b3a9c27
+Create Date: 2026-10-18 21:14:36.208417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d3e5a7c1b26'
+down_revision = 'f5d18b3a9c27'
+branch_labels = None
+depends_on = None
+
+BANDS = 8
+TABLES = ('photo', 'birth_photo')
+
+
+def upgrade():
+    for table in TABLES:
+        for band in range(BANDS):
+            op.create_index(f'ix_{table}_phash_b{band}', table,
+                            [sa.text(f'substr(phash, {band * 2 + 1}, 2)')], unique=False)
+
+
+def downgrade():
+    for table in TABLES:
+        for band in range(BANDS):
+            op.drop_index(f'ix_{table}_phash_b{band}', table_name=table)
@@ -0,0 +1,50 @@
+"""Make uploaded_at NOT NULL
+
+Keyset pagination compares (uploaded_at, id) tuples, which silently drops rows
+with a NULL uploaded_at from every page after the first. Existing NULLs are
+backfilled with the migration time.
+
+SQLite has no ALTER COLUMN, so batch mode copies the table there, and the copy
+does not carry the phash band expression indexes; they are rebuilt afterwards.
+
+Revision ID: b3e8f1a4c690
+Revises: 9d3e5a7c1b26
+Create Date: 2026-10-18 23:02:11.574120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e8f1a4c690'
+down_revision = '9d3e5a7c1b26'
+branch_labels = None
+depends_on = None
+
+TABLES = ('photo', 'birth_photo')
+PHASH_BANDS = 8
+
+
+def _set_nullable(table, nullable):
+    sqlite = op.get_bind().dialect.name == 'sqlite'
+    if sqlite:
+        for band in range(PHASH_BANDS):
+            op.drop_index(f'ix_{table}_phash_b{band}', table_name=table)
+    with op.batch_alter_table(table, schema=None) as batch_op:
+        batch_op.alter_column('uploaded_at', existing_type=sa.DateTime(), nullable=nullable)
+    if sqlite:
+        for band in range(PHASH_BANDS):
+            op.create_index(f'ix_{table}_phash_b{band}', table,
+                            [sa.text(f'substr(phash, {band * 2 + 1}, 2)')], unique=False)
+
+
+def upgrade():
+    for table in TABLES:
+        op.execute(f'UPDATE {table} SET uploaded_at = CURRENT_TIMESTAMP WHERE uploaded_at IS NULL')
+        _set_nullable(table, False)
+
+
+def downgrade():
+    for table in reversed(TABLES):
+        _set_nullable(table, True)
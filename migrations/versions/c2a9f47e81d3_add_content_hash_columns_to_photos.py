@@ -0,0 +1,46 @@
+"""Add content hash and perceptual hash columns to photos
+
+Also indexes object_key, which delete-time reference counting filters on.
+
+Revision ID: c2a9f47e81d3
+Revises: 5b7e0d2c4f18
+Create Date: 2026-10-18 13:42:05.127693
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2a9f47e81d3'
+down_revision = '5b7e0d2c4f18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('photo', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('phash', sa.String(length=16), nullable=True))
+        batch_op.create_index('ix_photo_content_hash', ['content_hash'], unique=False)
+        batch_op.create_index('ix_photo_object_key', ['object_key'], unique=False)
+
+    with op.batch_alter_table('birth_photo', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('phash', sa.String(length=16), nullable=True))
+        batch_op.create_index('ix_birth_photo_content_hash', ['content_hash'], unique=False)
+        batch_op.create_index('ix_birth_photo_object_key', ['object_key'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('birth_photo', schema=None) as batch_op:
+        batch_op.drop_index('ix_birth_photo_object_key')
+        batch_op.drop_index('ix_birth_photo_content_hash')
+        batch_op.drop_column('phash')
+        batch_op.drop_column('content_hash')
+
+    with op.batch_alter_table('photo', schema=None) as batch_op:
+        batch_op.drop_index('ix_photo_object_key')
+        batch_op.drop_index('ix_photo_content_hash')
+        batch_op.drop_column('phash')
+        batch_op.drop_column('content_hash')
@@ -0,0 +1,35 @@
+"""Add collection_version table for HTTP caching
+
+Revision ID: f5d18b3a9c27
+Revises: c2a9f47e81d3
+Create Date: 2026-10-18 15:08:52.664190
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f5d18b3a9c27'
+down_revision = 'c2a9f47e81d3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    collection_version = op.create_table('collection_version',
+    sa.Column('name', sa.String(length=32), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    now = datetime.utcnow()
+    op.bulk_insert(collection_version, [
+        {'name': 'photo', 'version': 1, 'updated_at': now},
+        {'name': 'birth_photo', 'version': 1, 'updated_at': now},
+    ])
+
+
+def downgrade():
+    op.drop_table('collection_version')
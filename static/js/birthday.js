@@ -429,6 +429,24 @@ document.addEventListener('DOMContentLoaded', function() {
             }
 
             console.log('🎂 開始上傳生日照片');
+            if (!uploadForm.dataset.presignUrl) return;
+
+            e.preventDefault();
+            const formData = new FormData(uploadForm);
+            const fields = {};
+            ['birthday_year', 'birthday_date', 'description'].forEach(name => {
+                fields[name] = formData.get(name) || '';
+            });
+            window.directUpload(uploadForm, Array.from(fileInput.files), fields)
+                .then(failures => {
+                    failures.forEach(message => showNotification(message, 'error'));
+                    setTimeout(() => window.location.reload(), failures.length ? 2000 : 0);
+                })
+                .catch(error => {
+                    // 直傳失敗時改用原本的表單上傳
+                    console.warn('直傳失敗，改用表單上傳', error);
+                    uploadForm.submit();
+                });
         });
 
         console.log('📁 文件上傳功能已初始化');
@@ -729,6 +747,123 @@ document.addEventListener('DOMContentLoaded', function() {
         console.log('⌨️ 快捷鍵支援已啟用');
     }
 
+    // ===== 分頁載入更多生日照片 =====
+    const CARD_SIZES = '(max-width: 640px) 100vw, 400px';
+
+    function initGalleryPagination() {
+        const gallery = document.querySelector('.birthday-gallery');
+        const sentinel = document.querySelector('.gallery-sentinel');
+        if (!gallery || !sentinel) return;
+        const apiUrl = gallery.dataset.apiUrl;
+        let nextCursor = gallery.dataset.nextCursor;
+        if (!apiUrl || !nextCursor || !('IntersectionObserver' in window)) return;
+
+        let isLoading = false;
+
+        function createCard(photo) {
+            const card = document.createElement('div');
+            card.className = 'photo-card';
+            card.dataset.photoId = photo.id;
+            card.dataset.year = photo.birthday_year;
+
+            const frame = document.createElement('div');
+            frame.className = 'photo-frame';
+
+            if (photo.status === 'ready') {
+                const picture = document.createElement('picture');
+                photo.sources.forEach(source => {
+                    const sourceEl = document.createElement('source');
+                    sourceEl.type = source.type;
+                    sourceEl.sizes = CARD_SIZES;
+                    sourceEl.srcset = source.srcset;
+                    picture.appendChild(sourceEl);
+                });
+
+                const img = document.createElement('img');
+                img.className = 'birthday-photo';
+                if (photo.srcset) {
+                    img.sizes = CARD_SIZES;
+                    img.srcset = photo.srcset;
+                }
+                img.src = photo.url;
+                img.loading = 'lazy';
+                img.alt = `生日照片 ${photo.birthday_year}年${photo.description ? ' - ' + photo.description : ''}`;
+                img.addEventListener('click', function() { showPhotoModal(this); });
+                picture.appendChild(img);
+                frame.appendChild(picture);
+            } else {
+                const placeholder = document.createElement('div');
+                placeholder.className = `photo-status ${photo.status}`;
+                placeholder.textContent = photo.status === 'pending' ? '⏳ 處理中...' : '⚠️ 處理失敗';
+                frame.appendChild(placeholder);
+            }
+
+            const yearTag = document.createElement('div');
+            yearTag.className = 'year-tag';
+            yearTag.textContent = photo.birthday_year;
+            frame.appendChild(yearTag);
+
+            const form = document.createElement('form');
+            form.action = photo.delete_url;
+            form.method = 'post';
+            form.className = 'delete-form';
+            form.addEventListener('submit', function(e) {
+                if (!confirm('確定要刪除這張生日照片嗎？')) e.preventDefault();
+            });
+            const button = document.createElement('button');
+            button.type = 'submit';
+            button.className = 'delete-btn';
+            button.setAttribute('aria-label', '刪除照片');
+            button.textContent = '×';
+            form.appendChild(button);
+            frame.appendChild(form);
+            card.appendChild(frame);
+
+            const info = document.createElement('div');
+            info.className = 'photo-info';
+            if (photo.description) {
+                const description = document.createElement('p');
+                description.className = 'photo-description';
+                description.textContent = photo.description;
+                info.appendChild(description);
+            }
+            const date = document.createElement('p');
+            date.className = 'photo-date';
+            date.textContent = photo.date_display;
+            info.appendChild(date);
+            card.appendChild(info);
+            return card;
+        }
+
+        async function loadMore() {
+            if (isLoading || !nextCursor) return;
+            isLoading = true;
+            try {
+                const url = new URL(apiUrl, window.location.origin);
+                url.searchParams.set('cursor', nextCursor);
+                const response = await fetch(url, { headers: { 'Accept': 'application/json' } });
+                if (!response.ok) throw new Error(`HTTP ${response.status}`);
+                const data = await response.json();
+                data.photos.forEach(photo => gallery.appendChild(createCard(photo)));
+                nextCursor = data.next_cursor;
+            } catch (error) {
+                console.error('載入更多生日照片失敗:', error);
+            } finally {
+                isLoading = false;
+                // 重新觀察，讓仍在畫面內的 sentinel 再觸發一次
+                observer.disconnect();
+                if (nextCursor) observer.observe(sentinel);
+            }
+        }
+
+        const observer = new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting)) loadMore();
+        }, { rootMargin: '600px' });
+        observer.observe(sentinel);
+
+        console.log('📜 生日照片分頁載入已啟用');
+    }
+
     // ===== 性能優化：懶加載圖片 =====
     function setupLazyLoading() {
         if ('IntersectionObserver' in window) {
@@ -799,6 +934,13 @@ document.addEventListener('DOMContentLoaded', function() {
             initYearFilters();          // 📅 年份篩選
             initBirthdayEffects();      // 🎊 生日特效
             initKeyboardShortcuts();    // ⌨️ 快捷鍵
+            initGalleryPagination();    // 📜 分頁載入
+            window.initBulkSelect({     // ☑️ 多選刪除
+                container: document.querySelector('.birthday-gallery'),
+                itemSelector: '.photo-card[data-photo-id]',
+                noun: '生日照片',
+                notify: showNotification
+            });
             setupLazyLoading();         // 🖼️ 懶加載
             setupErrorHandling();       // 🛡️ 錯誤處理
             addConfettiStyles();        // 🎨 動畫樣式
@@ -0,0 +1,68 @@
+// ===== 多選與批次刪除（回憶膠卷與生日頁面共用） =====
+
+/**
+ * 啟用頁面上的 .bulk-toolbar：切換多選模式、點選照片，再以 data-bulk-delete-url 批次刪除
+ * container：照片容器，多選模式時加上 selecting class
+ * itemSelector：可選取的照片元素（需有 data-photo-id）
+ * noun：確認訊息中照片的稱呼；notify(message, type)：顯示通知
+ */
+window.initBulkSelect = function({container, itemSelector, noun, notify}) {
+    const toolbar = document.querySelector('.bulk-toolbar');
+    if (!toolbar || !container) return;
+    const toggleButton = toolbar.querySelector('.bulk-toggle');
+    const deleteButton = toolbar.querySelector('.bulk-delete');
+    const countLabel = toolbar.querySelector('.bulk-count');
+    const selected = new Set();
+
+    function refresh() {
+        countLabel.textContent = selected.size;
+        deleteButton.hidden = !container.classList.contains('selecting');
+        deleteButton.disabled = selected.size === 0;
+        container.querySelectorAll(itemSelector).forEach(item => {
+            item.classList.toggle('selected', selected.has(item.dataset.photoId));
+        });
+    }
+
+    toggleButton.addEventListener('click', function() {
+        const selecting = container.classList.toggle('selecting');
+        toggleButton.textContent = selecting ? '✖️ 取消多選' : '☑️ 多選';
+        if (!selecting) selected.clear();
+        refresh();
+    });
+
+    // 多選模式下點照片只切換選取，不開啟預覽
+    container.addEventListener('click', function(e) {
+        if (!container.classList.contains('selecting')) return;
+        const item = e.target.closest(itemSelector);
+        if (!item) return;
+        e.preventDefault();
+        e.stopPropagation();
+        const id = item.dataset.photoId;
+        if (selected.has(id)) selected.delete(id); else selected.add(id);
+        refresh();
+    }, true);
+
+    deleteButton.addEventListener('click', async function() {
+        if (!selected.size || !confirm(`確定要刪除 ${selected.size} 張${noun}嗎？`)) return;
+        deleteButton.disabled = true;
+        try {
+            const response = await fetch(toolbar.dataset.bulkDeleteUrl, {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({ids: Array.from(selected, Number)})
+            });
+            const result = await response.json();
+            if (!response.ok) throw new Error(result.error || `HTTP ${response.status}`);
+            if (result.storage_failures.length) {
+                notify(`已刪除 ${result.deleted.length} 張，${result.storage_failures.length} 個檔案稍後會再重試刪除`, 'warning');
+            }
+            setTimeout(() => window.location.reload(), result.storage_failures.length ? 2000 : 0);
+        } catch (error) {
+            console.error('批次刪除失敗:', error);
+            notify('批次刪除失敗，請稍後再試', 'error');
+            deleteButton.disabled = false;
+        }
+    });
+
+    refresh();
+};
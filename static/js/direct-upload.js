@@ -0,0 +1,45 @@
+// ===== 瀏覽器直傳（回憶膠卷與生日頁面共用） =====
+
+/**
+ * 取得 presigned URL 後把檔案直接 PUT 到 bucket，再回報伺服器登記
+ * form 的 data-presign-url / data-complete-url 指定兩個 API，fields 會一起送到 complete
+ * 回傳失敗訊息的陣列；presign 或 complete 請求本身失敗時拋出例外，呼叫端可改用表單上傳
+ */
+window.directUpload = async function(form, files, fields = {}) {
+    const postJson = (url, body) => fetch(url, {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify(body)
+    }).then(response => {
+        if (!response.ok) throw new Error(`HTTP ${response.status}`);
+        return response.json();
+    });
+
+    const signed = await postJson(form.dataset.presignUrl, {
+        filenames: files.map(file => file.name)
+    });
+    const keys = [];
+    const failures = [];
+    await Promise.all(signed.uploads.map(async (upload, i) => {
+        if (upload.error) {
+            failures.push(`${upload.filename}: ${upload.error}`);
+            return;
+        }
+        const response = await fetch(upload.url, {
+            method: upload.method,
+            headers: upload.headers,
+            body: files[i]
+        });
+        if (response.ok) {
+            keys.push(upload.key);
+        } else {
+            failures.push(`${upload.filename}: HTTP ${response.status}`);
+        }
+    }));
+    if (keys.length) {
+        const registered = await postJson(form.dataset.completeUrl, {...fields, keys});
+        registered.uploads.filter(item => item.error)
+            .forEach(item => failures.push(item.error));
+    }
+    return failures;
+};
@@ -90,6 +90,7 @@ document.addEventListener('DOMContentLoaded', function() {
         }
         
         adjustAnimationSpeed();
+        filmStrip.addEventListener('film:updated', adjustAnimationSpeed);
         
         filmContainer.addEventListener('mouseenter', function() {
             if (!isAnimationPaused) filmStrip.style.animationPlayState = 'paused';
@@ -148,6 +149,117 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
 
+    /* ---------- 分頁載入更多回憶 ---------- */
+    const FRAME_SIZES = '(max-width: 480px) 200px, (max-width: 768px) 250px, 300px';
+
+    function initFilmPagination() {
+        if (!filmStrip || !filmContainer) return;
+        const apiUrl = filmStrip.dataset.apiUrl;
+        let nextCursor = filmStrip.dataset.nextCursor;
+        if (!apiUrl || !nextCursor || !('IntersectionObserver' in window)) return;
+
+        let isLoading = false;
+        // 膠卷內容會重複兩次以便無縫循環，frameCount 是單份的張數
+        let frameCount = filmStrip.querySelectorAll('.frame').length / 2;
+
+        function formatUploadTime(value) {
+            return value ? value.slice(0, 16).replace('T', ' ') : '';
+        }
+
+        function createStatus(status) {
+            const placeholder = document.createElement('div');
+            placeholder.className = `photo-status ${status}`;
+            placeholder.textContent = status === 'pending' ? '⏳ 處理中...' : '⚠️ 處理失敗';
+            return placeholder;
+        }
+
+        function createFrame(photo) {
+            const frame = document.createElement('div');
+            frame.className = 'frame';
+            frame.dataset.photoId = photo.id;
+
+            if (photo.status === 'ready') {
+                const picture = document.createElement('picture');
+                photo.sources.forEach(source => {
+                    const sourceEl = document.createElement('source');
+                    sourceEl.type = source.type;
+                    sourceEl.sizes = FRAME_SIZES;
+                    sourceEl.srcset = source.srcset;
+                    picture.appendChild(sourceEl);
+                });
+
+                const img = document.createElement('img');
+                img.className = 'preview-img';
+                if (photo.srcset) {
+                    img.sizes = FRAME_SIZES;
+                    img.srcset = photo.srcset;
+                }
+                img.src = photo.url;
+                img.loading = 'lazy';
+                img.alt = `回憶，上傳時間：${formatUploadTime(photo.uploaded_at)}`;
+                img.dataset.photoId = photo.id;
+                picture.appendChild(img);
+                frame.appendChild(picture);
+            } else {
+                frame.appendChild(createStatus(photo.status));
+            }
+
+            const form = document.createElement('form');
+            form.action = photo.delete_url;
+            form.method = 'post';
+            form.className = 'delete-form';
+            form.addEventListener('submit', function(e) {
+                if (!confirm('確定要刪除這個回憶嗎？')) e.preventDefault();
+            });
+            const button = document.createElement('button');
+            button.type = 'submit';
+            button.setAttribute('aria-label', '刪除回憶');
+            button.textContent = '×';
+            form.appendChild(button);
+            frame.appendChild(form);
+            return frame;
+        }
+
+        async function loadMore() {
+            if (isLoading || !nextCursor) return;
+            isLoading = true;
+            try {
+                const url = new URL(apiUrl, window.location.origin);
+                url.searchParams.set('cursor', nextCursor);
+                const response = await fetch(url, { headers: { 'Accept': 'application/json' } });
+                if (!response.ok) throw new Error(`HTTP ${response.status}`);
+                const data = await response.json();
+
+                // 新的照片同時加在第一份的結尾與第二份的結尾
+                const secondCopyStart = filmStrip.querySelectorAll('.frame')[frameCount];
+                data.photos.forEach(photo => {
+                    frameCount += 1;
+                    filmStrip.insertBefore(createFrame(photo), secondCopyStart);
+                    filmStrip.appendChild(createFrame(photo));
+                });
+                nextCursor = data.next_cursor;
+                filmStrip.dispatchEvent(new Event('film:updated'));
+            } catch (error) {
+                console.error('載入更多回憶失敗:', error);
+            } finally {
+                isLoading = false;
+                observeLastFrame();
+            }
+        }
+
+        const observer = new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting)) loadMore();
+        }, { root: filmContainer, rootMargin: '400px' });
+
+        function observeLastFrame() {
+            observer.disconnect();
+            if (!nextCursor) return;
+            observer.observe(filmStrip.querySelectorAll('.frame')[frameCount - 1]);
+        }
+
+        observeLastFrame();
+    }
+
     /* ---------- 上傳管理 ---------- */
     function initFileUpload() {
         if (!uploadForm || !fileInput) return;
@@ -263,6 +375,19 @@ document.addEventListener('DOMContentLoaded', function() {
                 return;
             }
             showLoadingIndicator();
+            if (!uploadForm.dataset.presignUrl) return;
+
+            e.preventDefault();
+            window.directUpload(uploadForm, Array.from(fileInput.files))
+                .then(failures => {
+                    failures.forEach(message => showNotification(message, 'error'));
+                    setTimeout(() => window.location.reload(), failures.length ? 2000 : 0);
+                })
+                .catch(error => {
+                    // 直傳失敗時改用原本的表單上傳
+                    console.warn('直傳失敗，改用表單上傳', error);
+                    uploadForm.submit();
+                });
         });
     }
     
@@ -362,6 +487,13 @@ document.addEventListener('DOMContentLoaded', function() {
     function init() {
         initImagePreview();
         initFilmStripAnimation();
+        initFilmPagination();
+        window.initBulkSelect({
+            container: document.querySelector('.film-strip-container'),
+            itemSelector: '.frame[data-photo-id]',
+            noun: '回憶',
+            notify: showNotification
+        });
         initFileUpload();
         initResponsiveHandling();
         initKeyboardShortcuts();
@@ -0,0 +1,110 @@
+"""批次刪除：DeleteObjects 分批、找不到的 id，以及 R2 部分失敗"""
+from conftest import bucket_keys, put_object
+
+def _add(app, model, key, variant_count=0, upload_variants=True, **fields):
+    """寫入一筆照片紀錄並把主圖與 variant_count 個衍生圖放進 bucket，回傳 id
+
+    upload_variants=False 時只放主圖（不存在的 key 照樣可以刪除，省下上傳時間）。
+    """
+    from app.extensions import db
+    variants = [{'key': f'{key}_{i}.webp', 'width': i, 'format': 'webp', 'bytes': 1} for i in range(variant_count)]
+    put_object(app, key, b'x')
+    for variant in variants if upload_variants else ():
+        put_object(app, variant['key'], b'x')
+    with app.app_context():
+        row = model(object_key=key, url='', variants=variants, **fields)
+        db.session.add(row)
+        db.session.commit()
+        return row.id
+
+def _spy_delete_objects(app, monkeypatch, errors=None, raises=None):
+    """記錄每次 DeleteObjects 的 key 數；errors 中的 key 回報為失敗，raises 時整批失敗"""
+    from app.services.storage import get_r2_client
+    with app.app_context():
+        client = get_r2_client()
+    real = client.delete_objects
+    batches = []
+
+    def delete_objects(**kwargs):
+        keys = [obj['Key'] for obj in kwargs['Delete']['Objects']]
+        batches.append(len(keys))
+        if raises is not None:
+            raise raises
+        kwargs['Delete']['Objects'] = [{'Key': key} for key in keys if key not in (errors or ())]
+        response = real(**kwargs)
+        response['Errors'] = [{'Key': key, 'Code': 'InternalError', 'Message': 'boom'}
+                              for key in keys if key in (errors or ())]
+        return response
+
+    monkeypatch.setattr(client, 'delete_objects', delete_objects)
+    return batches
+
+def test_delete_objects_splits_batches_of_1000(app, monkeypatch):
+    from app.services.storage import delete_objects
+    batches = _spy_delete_objects(app, monkeypatch)
+    keys = [f'k{i}.jpg' for i in range(2500)]
+    put_object(app, 'k0.jpg', b'x')
+    put_object(app, 'k2499.jpg', b'x')
+    with app.app_context():
+        # 重複的 key 只送一次
+        assert delete_objects(keys + keys[:10]) == {}
+    assert batches == [1000, 1000, 500]
+    assert bucket_keys(app) == set()
+
+def test_bulk_delete_over_1000_keys(app, client, monkeypatch):
+    from app.models import Photo
+    ids = [_add(app, Photo, f'p{n}.jpg', variant_count=400, upload_variants=False) for n in range(3)]
+    batches = _spy_delete_objects(app, monkeypatch)
+
+    result = client.post('/delete/bulk', json={'ids': ids}).get_json()
+    assert result == {'deleted': ids, 'not_found': [], 'storage_failures': []}
+    assert batches == [1000, 203]
+    assert bucket_keys(app) == set()
+    with app.app_context():
+        assert Photo.query.count() == 0
+
+def test_bulk_delete_reports_not_found_ids(app, client):
+    from app.models import BirthPhoto
+    photo_id = _add(app, BirthPhoto, 'cake.jpg', birthday_year=2024, birthday_date='06-26')
+
+    result = client.post('/birthday/delete/bulk', json={'ids': [999, photo_id, str(photo_id), 'abc']}).get_json()
+    # 重複的 id 只算一次，不是數字的 id 直接略過
+    assert result == {'deleted': [photo_id], 'not_found': [999], 'storage_failures': []}
+    assert bucket_keys(app) == set()
+
+def test_bulk_delete_rejects_too_many_ids(app, client):
+    app.config['BULK_DELETE_MAX'] = 2
+    response = client.post('/delete/bulk', json={'ids': [1, 2, 3]})
+    assert response.status_code == 400
+
+def test_bulk_delete_keeps_objects_shared_with_other_albums(app, client):
+    from app.models import Photo, BirthPhoto
+    photo_id = _add(app, Photo, 'same.jpg')
+    _add(app, BirthPhoto, 'same.jpg', birthday_year=2024, birthday_date='06-26')
+
+    result = client.post('/delete/bulk', json={'ids': [photo_id]}).get_json()
+    assert result['deleted'] == [photo_id]
+    assert bucket_keys(app) == {'same.jpg'}
+
+def test_bulk_delete_reports_partial_storage_failures(app, client, monkeypatch):
+    from app.models import Photo
+    ids = [_add(app, Photo, 'keep.jpg', variant_count=1), _add(app, Photo, 'gone.jpg')]
+    _spy_delete_objects(app, monkeypatch, errors={'keep.jpg_0.webp'})
+
+    result = client.post('/delete/bulk', json={'ids': ids}).get_json()
+    # 紀錄照樣刪除，失敗的 key 回報給呼叫端
+    assert result['deleted'] == ids
+    assert result['storage_failures'] == [{'key': 'keep.jpg_0.webp', 'error': 'boom'}]
+    assert bucket_keys(app) == {'keep.jpg_0.webp'}
+    with app.app_context():
+        assert Photo.query.count() == 0
+
+def test_bulk_delete_reports_every_key_when_the_request_fails(app, client, monkeypatch):
+    from app.models import Photo
+    ids = [_add(app, Photo, 'a.jpg', variant_count=1), _add(app, Photo, 'b.jpg')]
+    _spy_delete_objects(app, monkeypatch, raises=ConnectionError('R2 unreachable'))
+
+    result = client.post('/delete/bulk', json={'ids': ids}).get_json()
+    assert result['deleted'] == ids
+    assert {failure['key'] for failure in result['storage_failures']} == {'a.jpg', 'a.jpg_0.webp', 'b.jpg'}
+    assert {failure['error'] for failure in result['storage_failures']} == {'R2 unreachable'}
@@ -0,0 +1,68 @@
+"""瀏覽器直傳流程：presign -> 直接 PUT 到 bucket -> complete，以 moto 取代 R2"""
+import urllib.error, urllib.request
+from conftest import bucket_keys, jpeg_bytes
+
+def _put(upload, body):
+    """像瀏覽器一樣把檔案 PUT 到 presigned URL，回傳 HTTP 狀態碼"""
+    request = urllib.request.Request(upload['url'], data=body, method=upload['method'],
+                                     headers=upload['headers'])
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+def test_presign_put_complete_registers_photo(app, client):
+    from app.extensions import db
+    from app.models import Photo, STATUS_READY
+    from app.services.storage import INCOMING_PREFIX
+
+    signed = client.post('/upload/presign', json={'filenames': ['cat.jpg', 'notes.txt']}).get_json()['uploads']
+    assert signed[1] == {'filename': 'notes.txt', 'error': '不支援的檔案格式'}
+    upload = signed[0]
+    assert upload['key'].startswith(INCOMING_PREFIX)
+    assert _put(upload, jpeg_bytes()) == 200
+
+    items = client.post('/upload/complete', json={'keys': [upload['key']]}).get_json()['uploads']
+    assert len(items) == 1 and 'error' not in items[0]
+
+    with app.app_context():
+        photo = db.session.get(Photo, items[0]['id'])
+        assert photo.status == STATUS_READY
+        assert photo.content_hash and photo.object_key == f'{photo.content_hash}.jpg'
+        expected = {photo.object_key} | {variant['key'] for variant in photo.variants}
+    keys = bucket_keys(app)
+    assert expected <= keys
+    # 處理完成後刪除 incoming 暫存檔
+    assert not any(key.startswith(INCOMING_PREFIX) for key in keys)
+
+def test_complete_rejects_missing_and_foreign_keys(app, client):
+    from app.models import Photo
+
+    upload = client.post('/upload/presign', json={'filenames': ['cat.jpg']}).get_json()['uploads'][0]
+    # 沒有 PUT 就回報完成，以及不是 presign 發出的 key
+    items = client.post('/upload/complete', json={'keys': [upload['key'], 'photos/secret.jpg']}).get_json()['uploads']
+    assert [item['error'] for item in items] == ['找不到已上傳的檔案', '無效的上傳代碼']
+    with app.app_context():
+        assert Photo.query.count() == 0
+
+def test_birthday_complete_uses_album_fields(app, client):
+    from app.extensions import db
+    from app.models import BirthPhoto, STATUS_READY
+
+    upload = client.post('/birthday/presign', json={'filenames': ['cake.jpg']}).get_json()['uploads'][0]
+    assert _put(upload, jpeg_bytes(color=(40, 200, 40))) == 200
+    response = client.post('/birthday/complete', json={
+        'keys': [upload['key']], 'birthday_year': '2024', 'birthday_date': '06-26', 'description': '蛋糕',
+    })
+    items = response.get_json()['uploads']
+    assert 'error' not in items[0]
+    with app.app_context():
+        photo = db.session.get(BirthPhoto, items[0]['id'])
+        assert (photo.birthday_year, photo.birthday_date, photo.description) == (2024, '06-26', '蛋糕')
+        assert photo.status == STATUS_READY
+
+def test_direct_upload_disabled_returns_404(app, client):
+    app.config['DIRECT_UPLOAD_ENABLED'] = False
+    assert client.post('/upload/presign', json={'filenames': ['cat.jpg']}).status_code == 404
+    assert client.post('/upload/complete', json={'keys': []}).status_code == 404
@@ -0,0 +1,73 @@
+"""相簿匯出：邊讀 R2 邊產生的 ZIP 串流"""
+import io, zipfile
+from datetime import datetime
+from conftest import put_object
+
+def _add(app, model, key, uploaded_at, body=None, **fields):
+    """寫入一筆照片紀錄；給定 body 時同時把原檔放進 bucket"""
+    from app.extensions import db
+    if body is not None:
+        put_object(app, key, body)
+    with app.app_context():
+        row = model(object_key=key, url='', uploaded_at=uploaded_at, **fields)
+        db.session.add(row)
+        db.session.commit()
+        return row.id
+
+def _archive(response):
+    assert response.status_code == 200
+    return zipfile.ZipFile(io.BytesIO(response.get_data()))
+
+def test_memory_export_streams_ready_photos_in_upload_order(app, client):
+    from app.models import Photo, STATUS_PENDING
+    _add(app, Photo, 'b.png', datetime(2024, 5, 2, 8, 0, 0), b'second')
+    _add(app, Photo, 'a.jpg', datetime(2024, 5, 1, 20, 30, 15), b'first')
+    # 處理中的照片還沒有檔案，不會出現在匯出中
+    _add(app, Photo, 'incoming/x.jpg', datetime(2024, 5, 3), status=STATUS_PENDING)
+
+    response = client.get('/memory/export')
+    assert response.mimetype == 'application/zip'
+    assert response.headers['Content-Disposition'] == 'attachment; filename="memories.zip"'
+    assert response.headers['Cache-Control'] == 'no-store'
+    assert response.headers['X-Accel-Buffering'] == 'no'
+    assert 'Content-Length' not in response.headers
+
+    archive = _archive(response)
+    assert archive.namelist() == ['0001_20240501_203015.jpg', '0002_20240502_080000.png']
+    assert archive.read('0001_20240501_203015.jpg') == b'first'
+    assert archive.getinfo('0001_20240501_203015.jpg').date_time == (2024, 5, 1, 20, 30, 14)  # ZIP 時間以 2 秒為單位
+    assert archive.getinfo('0002_20240502_080000.png').compress_type == zipfile.ZIP_STORED
+
+def test_memory_export_pages_through_rows(app):
+    from app.models import Photo
+    from app.services.export import iter_rows
+    from app.services.photo_service import list_photos_page
+    ids = [_add(app, Photo, f'{i}.jpg', datetime(2024, 1, 1, 0, 0, i)) for i in range(5)]
+    with app.app_context():
+        assert [photo.id for photo in iter_rows(list_photos_page, batch_size=2)] == ids
+
+def test_missing_objects_are_listed_in_errors_txt(app, client):
+    from app.models import Photo
+    _add(app, Photo, 'ok.jpg', datetime(2024, 1, 1), b'ok')
+    _add(app, Photo, 'gone.jpg', datetime(2024, 1, 2))
+
+    archive = _archive(client.get('/memory/export'))
+    assert archive.namelist() == ['0001_20240101_000000.jpg', 'errors.txt']
+    assert '0002_20240102_000000.jpg' in archive.read('errors.txt').decode()
+
+def test_birthday_year_export_uses_year_folder_newest_first(app, client):
+    from app.models import BirthPhoto
+    fields = {'birthday_date': '06-26'}
+    _add(app, BirthPhoto, 'old.jpg', datetime(2024, 6, 26, 9), b'old', birthday_year=2024, **fields)
+    _add(app, BirthPhoto, 'new.jpg', datetime(2024, 6, 26, 18), b'new', birthday_year=2024, **fields)
+    _add(app, BirthPhoto, 'other.jpg', datetime(2023, 6, 26), b'other', birthday_year=2023, **fields)
+
+    response = client.get('/birthday/year/2024/export')
+    assert response.headers['Content-Disposition'] == 'attachment; filename="birthday_2024.zip"'
+    archive = _archive(response)
+    assert archive.namelist() == ['2024/0001_20240626_180000.jpg', '2024/0002_20240626_090000.jpg']
+    assert archive.read('2024/0001_20240626_180000.jpg') == b'new'
+
+def test_empty_exports_are_valid_archives(app, client):
+    assert _archive(client.get('/memory/export')).namelist() == []
+    assert _archive(client.get('/birthday/year/1999/export')).namelist() == []
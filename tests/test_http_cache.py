@@ -0,0 +1,81 @@
+"""相簿頁面的 ETag / 304：版本號在上傳與刪除時遞增，有 flash 訊息時不快取"""
+import io
+from contextlib import contextmanager
+from conftest import jpeg_bytes
+
+def _upload(client, color=(200, 40, 40)):
+    data = {'photos': (io.BytesIO(jpeg_bytes(color=color)), 'cat.jpg')}
+    assert client.post('/upload/', data=data, content_type='multipart/form-data').status_code == 302
+    # 上傳後的 flash 訊息會讓下一次的頁面不帶 ETag，這裡不關心這些訊息
+    with client.session_transaction() as session:
+        session.pop('_flashes', None)
+
+@contextmanager
+def _count_queries(app):
+    from sqlalchemy import event
+    from app.extensions import db
+    counter = []
+    listener = lambda *args: counter.append(args[2])
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+
+def test_unchanged_gallery_returns_304(app, client):
+    response = client.get('/memory/')
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert response.cache_control.no_cache
+
+    again = client.get('/memory/', headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.headers['ETag'] == etag
+    assert again.get_data() == b''
+
+def test_last_modified_round_trip(app, client):
+    _upload(client)
+    response = client.get('/memory/')
+    last_modified = response.headers['Last-Modified']
+    assert client.get('/memory/', headers={'If-Modified-Since': last_modified}).status_code == 304
+
+def test_upload_and_delete_change_the_etag(app, client):
+    from app.models import Photo
+    before = client.get('/memory/').headers['ETag']
+    birthday = client.get('/birthday/').headers['ETag']
+
+    _upload(client)
+    after_upload = client.get('/memory/', headers={'If-None-Match': before})
+    assert after_upload.status_code == 200
+    assert after_upload.headers['ETag'] != before
+    # 其他相簿的版本號不受影響
+    assert client.get('/birthday/', headers={'If-None-Match': birthday}).status_code == 304
+
+    with app.app_context():
+        photo_id = Photo.query.one().id
+    assert client.post(f'/delete/{photo_id}').status_code == 302
+    after_delete = client.get('/memory/', headers={'If-None-Match': after_upload.headers['ETag']})
+    assert after_delete.status_code == 200
+    assert after_delete.headers['ETag'] not in (before, after_upload.headers['ETag'])
+
+def test_pending_flash_skips_the_etag(app, client):
+    etag = client.get('/memory/').headers['ETag']
+    with client.session_transaction() as session:
+        session['_flashes'] = [('warning', '照片已存在，已略過重複上傳')]
+
+    response = client.get('/memory/', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert 'ETag' not in response.headers
+    assert '照片已存在' in response.get_data(as_text=True)
+    # flash 顯示過之後恢復 304
+    assert client.get('/memory/', headers={'If-None-Match': etag}).status_code == 304
+
+def test_home_page_does_not_query_the_database(app, client):
+    etag = client.get('/').headers['ETag']
+    _upload(client)
+    with _count_queries(app) as queries:
+        assert client.get('/', headers={'If-None-Match': etag}).status_code == 304
+        assert client.get('/').status_code == 200
+    assert queries == []
@@ -1,3 +1,8 @@
+from dotenv import load_dotenv
+
+# 本地開發讀 .env（flask 指令由 Flask 自動載入）；必須在匯入 app 之前，設定類別在匯入時就讀取環境變數
+load_dotenv()
+
 from app import create_app
 
-app = create_app(config_name='production')
\ No newline at end of file
+app = create_app(config_name='production')